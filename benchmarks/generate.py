@@ -0,0 +1,139 @@
+"""
+Generate a synthetic repo to benchmark refac on.
+
+Modules are spread over packages `app.pkg0`, `app.pkg1`, ... and import each other
+with a mix of `import a.b`, `from a import b`, `from a.b import c` and relative
+imports, with usages of every imported name.
+
+    python -m benchmarks.generate /tmp/synthetic --modules 2000 --fan-in 20
+"""
+
+import argparse
+import dataclasses
+import pathlib
+import random
+import subprocess
+from dataclasses import dataclass
+from typing import List
+
+
+@dataclass
+class RepoSpec:
+    # Number of Python modules, not counting __init__.py files.
+    modules: int = 300
+    # Number of other modules importing each module.
+    fan_in: int = 10
+    # Share of imports written as relative imports.
+    relative_ratio: float = 0.2
+    # Approximate number of lines per module.
+    lines: int = 150
+    # Number of modules per package.
+    package_size: int = 25
+    seed: int = 0
+
+    def package(self, i: int) -> str:
+        return f"pkg{i // self.package_size}"
+
+    def module(self, i: int) -> str:
+        return f"app.{self.package(i)}.mod{i}"
+
+    def filename(self, i: int) -> str:
+        return f"app/{self.package(i)}/mod{i}.py"
+
+
+def generate(root: pathlib.Path, spec: RepoSpec) -> None:
+    """Write the repo described by `spec` to `root` and commit it to a new git repo."""
+    rng = random.Random(spec.seed)
+    imported: List[List[int]] = [[] for _ in range(spec.modules)]
+    for target in range(spec.modules):
+        sample = rng.sample(range(spec.modules), min(spec.fan_in + 1, spec.modules))
+        others = [i for i in sample if i != target]
+        for importer in others[: spec.fan_in]:
+            imported[importer].append(target)
+
+    (root / "app").mkdir(parents=True, exist_ok=True)
+    (root / "app/__init__.py").touch()
+    for i in range(0, spec.modules, spec.package_size):
+        (root / "app" / spec.package(i)).mkdir(exist_ok=True)
+        (root / "app" / spec.package(i) / "__init__.py").touch()
+    for i in range(spec.modules):
+        (root / spec.filename(i)).write_text(module_source(spec, rng, i, imported[i]))
+    (root / "README.md").write_text(
+        "".join(
+            f"- `{spec.module(i)}` lives in `{spec.filename(i)}`\n"
+            for i in range(0, spec.modules, 7)
+        )
+    )
+
+    git = ["git", "-c", "user.name=refac", "-c", "user.email=refac@example.com"]
+    subprocess.run([*git, "init", "-q"], cwd=root, check=True)
+    subprocess.run([*git, "add", "-A"], cwd=root, check=True)
+    subprocess.run([*git, "commit", "-q", "-m", "Generate"], cwd=root, check=True)
+
+
+def module_source(spec: RepoSpec, rng: random.Random, i: int, targets: List[int]) -> str:
+    imports: List[str] = []
+    usages: List[str] = []
+    for t in sorted(targets):
+        package = spec.package(t)
+        if rng.random() < spec.relative_ratio:
+            prefix = "." if package == spec.package(i) else f"..{package}."
+            imports.append(f"from {prefix}mod{t} import Model{t}")
+            usages.append(f"Model{t}")
+            continue
+        style = rng.randrange(3)
+        if style == 0:
+            imports.append(f"from {spec.module(t)} import Model{t}, func_{t}_0")
+            usages.extend([f"Model{t}", f"func_{t}_0(1)"])
+        elif style == 1:
+            imports.append(f"from app.{package} import mod{t}")
+            usages.append(f"mod{t}.CONSTANT_{t}")
+        else:
+            imports.append(f"import {spec.module(t)}")
+            usages.append(f"{spec.module(t)}.func_{t}_0(2)")
+
+    lines = [f'"""Synthetic module {spec.module(i)}."""', "", *imports, "", ""]
+    lines += [f"CONSTANT_{i} = {i}", "", ""]
+    lines += [f"class Model{i}:", "    def method(self):", f"        return CONSTANT_{i}"]
+    lines += ["", ""]
+    lines += ["def uses_imports():", "    return ("]
+    lines += [f"        {usage}," for usage in usages]
+    lines += ["    )", "", ""]
+    j = 0
+    while len(lines) < spec.lines or j == 0:
+        lines += [
+            f"def func_{i}_{j}(x):",
+            f'    """Do step {j} of module {i}."""',
+            f"    y = x + CONSTANT_{i}",
+            "    return y * 2",
+            "",
+            "",
+        ]
+        j += 1
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add a `--<field>` option for every field of `RepoSpec`."""
+    for field in dataclasses.fields(RepoSpec):
+        parser.add_argument(
+            f"--{field.name.replace('_', '-')}", type=field.type, default=field.default
+        )
+
+
+def from_arguments(args: argparse.Namespace) -> RepoSpec:
+    return RepoSpec(
+        **{field.name: getattr(args, field.name) for field in dataclasses.fields(RepoSpec)}
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root", type=pathlib.Path, help="empty directory to create the repo in")
+    add_arguments(parser)
+    args = parser.parse_args()
+    generate(args.root, from_arguments(args))
+
+
+if __name__ == "__main__":
+    main()
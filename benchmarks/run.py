@@ -0,0 +1,217 @@
+"""
+Time file, symbol and import moves end to end on a synthetic repo.
+
+Every move runs `repeats` times in a fresh process on a clean checkout, with a warm
+import index and an empty codemod result cache. The median total and per-phase
+times are written as JSON, and compared against a baseline if one is given:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --baseline results.json --threshold 0.2
+
+Exits with status 1 if any move got slower than the baseline by more than
+`threshold`, and with status 2 if there is no baseline at the given path.
+"""
+
+import argparse
+import contextlib
+import dataclasses
+import io
+import json
+import os
+import pathlib
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from benchmarks.generate import RepoSpec, add_arguments, from_arguments, generate
+
+REPO_DIR = pathlib.Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class Case:
+    name: str
+    type: str
+    srcs: List[str]
+    dsts: List[str]
+
+
+def cases(spec: RepoSpec) -> List[Case]:
+    """One move of each type, of modules imported by `spec.fan_in` other modules."""
+    return [
+        Case("file", "file", [spec.filename(0)], ["app/moved/mod0.py"]),
+        Case("directory", "file", [f"app/{spec.package(0)}"], ["app/moved_pkg"]),
+        Case(
+            "symbol",
+            "symbol",
+            [f"{spec.module(1)}.Model1"],
+            [f"app.{spec.package(1)}.new_home.Model1"],
+        ),
+        Case("import", "import", [spec.module(2)], ["app.vendored.mod2"]),
+    ]
+
+
+def measure(case: Case, jobs: int) -> Dict[str, Any]:
+    """Run `case` in this process and return its total and per-phase times."""
+    start = time.perf_counter()
+    from refac import timing
+    from refac.move_file import move_file
+    from refac.move_import import move_import
+    from refac.move_symbol import move_symbol
+
+    imported = time.perf_counter()
+    with timing.recording() as profile, contextlib.redirect_stdout(io.StringIO()):
+        if case.type == "file":
+            move_file(case.srcs, case.dsts, include_strings=True, jobs=jobs)
+        elif case.type == "symbol":
+            move_symbol(case.srcs, case.dsts, jobs=jobs)
+        else:
+            move_import(case.srcs, case.dsts, jobs=jobs)
+    end = time.perf_counter()
+    return {
+        "total": end - start,
+        "phases": {"import": imported - start, **profile.phases},
+    }
+
+
+def run_case(
+    case: Case, root: pathlib.Path, cache_dir: pathlib.Path, jobs: int
+) -> Dict[str, Any]:
+    """Run `case` in a fresh process on a clean checkout of `root`."""
+    subprocess.run(["git", "reset", "-q", "--hard"], cwd=root, check=True)
+    subprocess.run(["git", "clean", "-q", "-fdx"], cwd=root, check=True)
+    shutil.rmtree(cache_dir / "results", ignore_errors=True)
+    code = (
+        "import json, sys\n"
+        "from benchmarks.run import Case, measure\n"
+        "print(json.dumps(measure(Case(**json.loads(sys.argv[1])), int(sys.argv[2]))))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code, json.dumps(dataclasses.asdict(case)), str(jobs)],
+        cwd=root,
+        env=env(root, cache_dir),
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def env(root: pathlib.Path, cache_dir: pathlib.Path) -> Dict[str, str]:
+    path = [str(REPO_DIR / "src"), str(REPO_DIR), os.environ.get("PYTHONPATH", "")]
+    return {
+        **os.environ,
+        "ROOT_DIR": str(root),
+        "REFAC_CACHE_DIR": str(cache_dir),
+        "PYTHONPATH": os.pathsep.join(p for p in path if p),
+    }
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    phases = sorted({phase for run in runs for phase in run["phases"]})
+    return {
+        "total": statistics.median(run["total"] for run in runs),
+        "phases": {
+            phase: statistics.median(run["phases"].get(phase, 0.0) for run in runs)
+            for phase in phases
+        },
+        "runs": [run["total"] for run in runs],
+    }
+
+
+def benchmark(spec: RepoSpec, repeats: int, jobs: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root, cache_dir = pathlib.Path(temp_dir) / "repo", pathlib.Path(temp_dir) / "cache"
+        root.mkdir()
+        generate(root, spec)
+        # Build the import index once, like in a repo where refac was used before.
+        subprocess.run(
+            [sys.executable, "-c", "from refac.import_index import refresh_index; refresh_index()"],
+            cwd=root,
+            env=env(root, cache_dir),
+            check=True,
+        )
+        results = {}
+        for case in cases(spec):
+            runs = [run_case(case, root, cache_dir, jobs) for _ in range(repeats)]
+            results[case.name] = summarize(runs)
+    return {
+        "spec": dataclasses.asdict(spec),
+        "repeats": repeats,
+        "jobs": jobs,
+        "results": results,
+    }
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Return a message for every move that is slower than the baseline by more than `threshold`."""
+    if baseline["spec"] != results["spec"] or baseline["jobs"] != results["jobs"]:
+        raise Exception("The baseline was run with a different repo spec or number of jobs.")
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before, after = baseline["results"][name]["total"], result["total"]
+        if after > before * (1 + threshold):
+            regressions.append(
+                f"{name}: {after:.3f}s is {after / before - 1:.0%} slower than the baseline ({before:.3f}s)"
+            )
+    return regressions
+
+
+def report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    for name, result in results["results"].items():
+        line = f"{name:<10} {result['total']:8.3f}s"
+        if baseline is not None and name in baseline["results"]:
+            line += f"  (baseline {baseline['results'][name]['total']:.3f}s)"
+        phases = ", ".join(f"{phase} {t:.3f}s" for phase, t in result["phases"].items())
+        print(f"{line}  {phases}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--output", type=pathlib.Path, help="file to write the JSON results to")
+    parser.add_argument("--baseline", type=pathlib.Path, help="JSON results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="fail if a move is slower than the baseline by more than this ratio (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+    spec = from_arguments(args)
+
+    baseline = None
+    if args.baseline:
+        # Fail before the benchmark runs, rather than finding nothing to compare to.
+        if not args.baseline.exists():
+            parser.error(
+                f"No baseline at {args.baseline}. Save one first with "
+                f"`--output {args.baseline}`, e.g. on main (or `make bench-baseline`)."
+            )
+        baseline = json.loads(args.baseline.read_text())
+
+    results = benchmark(spec, args.repeats, args.jobs)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    report(results, baseline)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
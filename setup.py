@@ -19,6 +19,7 @@ CLASSIFIERS = [
     "Topic :: Software Development :: Libraries :: Python Modules",
 ]
 INSTALL_REQUIRES = ["libcst"]
+EXTRAS_REQUIRE = {"yaml": ["pyyaml"]}
 
 ###################################################################
 
@@ -58,6 +59,7 @@ if __name__ == "__main__":
         zip_safe=False,
         classifiers=CLASSIFIERS,
         install_requires=INSTALL_REQUIRES,
+        extras_require=EXTRAS_REQUIRE,
         options={"bdist_wheel": {"universal": "1"}},
         entry_points={"console_scripts": ["refac = refac.__init__:main"]},
     )
@@ -6,45 +6,187 @@ __author__ = "Benchling Open Source"
 __email__ = "opensource@benchling.com"
 
 import argparse
+import contextlib
+import json
+import os
 import sys
+import time
+from typing import List, Optional
 
-from .move_file import move_file
-from .move_import import move_import
-from .move_symbol import move_symbol
 
-
-def main():
+def main(argv: Optional[List[str]] = None):
     NAME = "refac"
     DESCRIPTION = "Move Python symbols."
     USAGE = """
-    refac [file|symbol|import] <src> <dst>
+    refac [file|symbol|import] <src> <dst> [--jobs N] [--max-memory SIZE] [--dry-run] [--profile] [--trace out.json]
+    refac plan <plan.yaml|plan.json> [--jobs N] [--max-memory SIZE] [--dry-run] [--profile] [--trace out.json]
+    refac serve
 
   examples:
     refac file /path/to/src.py /path/to/dst.py
+    refac file /path/to/src1.py,/path/to/src_dir /path/to/dst1.py,/path/to/dst_dir
     refac symbol path.to.SrcClass path.to.DstClass
     refac symbol path.to.src_func1,path.to.src_func2 path.to.dst_func1,path.to.dst_func2
     refac import path.to.src_import path.to.dst_import
+    refac plan path/to/plan.yaml
+    refac file /path/to/src.py /path/to/dst.py --dry-run > move.diff  # preview only
+    refac symbol path.to.SrcClass path.to.DstClass --profile  # where did the time go?
+    refac file /path/to/src_dir /path/to/dst_dir --trace trace.json  # open in ui.perfetto.dev
+    refac import path.to.src_import path.to.dst_import --max-memory 4G  # in a huge repo
+    refac serve  # keep refac warm in the background for faster moves in this repo
   """
 
+    from .memory import limit, parse_size
+
     parser = argparse.ArgumentParser(prog=NAME, description=DESCRIPTION, usage=USAGE)
     parser.add_argument(
         "type",
         type=str,
-        help="type of move to perform",
-        choices=["file", "symbol", "import"],
+        help="type of move to perform, or `serve` to start the daemon",
+        choices=["file", "symbol", "import", "plan", "serve"],
+    )
+    parser.add_argument(
+        "src", type=str, nargs="?", help="src or comma separated srcs, or the plan file"
+    )
+    parser.add_argument(
+        "dst", type=str, nargs="?", help="dst or comma separated dsts"
     )
-    parser.add_argument("src", type=str, help="src or comma separated srcs")
-    parser.add_argument("dst", type=str, help="dst or comma separated dsts")
-    args = parser.parse_args()
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="maximum number of processes used to update imports; small moves use one (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=parse_size,
+        metavar="SIZE",
+        help="codemod one file at a time per worker, keep new code in temp files, and use fewer workers near this much memory, like 4G",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="write nothing and print the changes as a unified diff instead",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print the time spent in each phase and on the slowest files to stderr",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        help="number of slowest files to list with --profile (default: 10)",
+    )
+    parser.add_argument(
+        "--profile-json",
+        type=str,
+        help="also write the time of every phase and file to this JSON file",
+    )
+    parser.add_argument(
+        "--trace",
+        type=str,
+        help="write a Chrome trace of every phase and file, across worker processes, to this JSON file",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="run in this process even if `refac serve` is running",
+    )
+    args = parser.parse_args(argv)
+
+    _type, src, dst, jobs = args.type, args.src, args.dst, args.jobs
+
+    if _type == "serve":
+        from .daemon import serve
 
-    _type, src, dst = args.type, args.src, args.dst
+        serve()
+        return
+    if src is None:
+        parser.error(f"src is required for `refac {_type}`")
+    if _type != "plan" and dst is None:
+        parser.error(f"dst is required for `refac {_type}`")
 
-    if src == dst:
+    if not args.no_daemon:
+        from .daemon import request
+
+        exit_code = request(sys.argv[1:] if argv is None else argv)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    if _type != "plan" and src == dst:
         sys.exit(0)
 
+    run = dry_run if args.dry_run else move
+    if not args.profile and not args.profile_json and not args.trace:
+        with limit(args.max_memory):
+            run(_type, src, dst, jobs)
+        return
+
+    from .memory import peak_rss
+    from .timing import add_memory, recording
+
+    start = time.perf_counter()
+    with recording() as profile, limit(args.max_memory):
+        run(_type, src, dst, jobs)
+        add_memory(os.getpid(), peak_rss())
+    total = time.perf_counter() - start
+    # Mostly importing libcst and the move functions.
+    profile.phases["other"] = max(0.0, total - sum(profile.phases.values()))
+    profile.phases["total"] = total
+    if args.profile or args.profile_json:
+        print(profile.report(args.profile_top), file=sys.stderr)
+    if args.profile_json:
+        with open(args.profile_json, "w") as f:
+            json.dump(profile.to_json(), f, indent=2)
+    if args.trace:
+        with open(args.trace, "w") as f:
+            json.dump(profile.to_trace(), f)
+
+
+def dry_run(_type: str, src: str, dst: Optional[str], jobs: int) -> None:
+    """Run a move in memory and print what it would change as a unified diff.
+
+    Progress reports go to stderr so that stdout is only the diff.
+    """
+    from . import fs
+    from .module_map import module_map
+    from .utils import ROOT_DIR
+
+    try:
+        with fs.dry_run():
+            with contextlib.redirect_stdout(sys.stderr):
+                move(_type, src, dst, jobs)
+            for file_diff in fs.diff(ROOT_DIR):
+                sys.stdout.write(file_diff)
+                sys.stdout.flush()
+    finally:
+        # The module map may have been scanned with the dry run's files.
+        module_map.cache_clear()
+
+
+def move(_type: str, src: str, dst: Optional[str], jobs: int) -> None:
+    # The move functions are imported here, so that `refac` can hand a command to the
+    # daemon (see `refac.daemon`) without importing libcst. Import them from their
+    # modules, like `from refac.move_file import move_file`.
+    if _type == "plan":
+        from .move_plan import move_plan
+
+        move_plan(src, jobs=jobs)
+        return
+    assert dst is not None
+
     if _type == "file":
-        move_file(src.split(","), dst.split(","), include_strings=True)
+        from .move_file import move_file
+
+        move_file(src.split(","), dst.split(","), include_strings=True, jobs=jobs)
     elif _type == "symbol":
-        move_symbol(src.split(","), dst.split(","))
+        from .move_symbol import move_symbol
+
+        move_symbol(src.split(","), dst.split(","), jobs=jobs)
     elif _type == "import":
-        move_import(src.split(","), dst.split(","))
+        from .move_import import move_import
+
+        move_import(src.split(","), dst.split(","), jobs=jobs)
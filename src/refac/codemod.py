@@ -0,0 +1,407 @@
+"""
+Run ReplaceImportCodemod over files in-process.
+
+This replaces piping candidate files into `python3 -m libcst.tool codemod`, which
+paid for interpreter startup and `.libcst.codemod.yaml` discovery on every batch.
+"""
+
+import functools
+import gc
+import os
+import pathlib
+import sys
+import traceback
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from libcst import Module, parse_module
+from libcst.codemod import CodemodContext
+from libcst.helpers import calculate_module_and_package
+
+from refac import fs, memory, timing
+from refac.import_index import ModuleSet, files_importing
+from refac.result_cache import ResultCache, pairs_key
+from refac.utils import ROOT_DIR
+from refac.visitors.replace_import import PairTrie, ReplaceImportCodemod
+
+
+# Below this many files, or bytes in all, codemodding in-process is faster than
+# starting a pool of workers, and much faster where workers are spawned, not forked.
+PARALLEL_MIN_FILES = 8
+PARALLEL_MIN_BYTES = 256 << 10
+
+
+@dataclass
+class CodemodResult:
+    """Outcome of running ReplaceImportCodemod on a single file."""
+
+    filename: str
+    changed: bool = False
+    code: Optional[str] = None
+    # The encoding of the file, which `code` is written back in.
+    encoding: str = "utf-8"
+    error: Optional[str] = None
+    cached: bool = False
+    # Bytes on disk of the entry added to the result cache for the file.
+    cache_bytes: int = 0
+    # When each step ran: read, prefilter, parse, metadata, transform, render.
+    spans: List[timing.Span] = field(default_factory=list)
+    # The process that codemodded the file.
+    pid: int = field(default_factory=os.getpid)
+    # Bytes of memory used by that process after the file, and at most so far.
+    rss: int = field(default_factory=memory.rss)
+    max_rss: int = field(default_factory=memory.peak_rss)
+
+    @property
+    def timings(self) -> Dict[str, float]:
+        """Seconds spent on each step."""
+        return timing.durations(self.spans)
+
+
+def codemod_file(
+    filename: str,
+    olds: Sequence[str],
+    news: Sequence[str],
+    cache: Optional[ResultCache] = None,
+    data: Optional[bytes] = None,
+) -> CodemodResult:
+    """Run ReplaceImportCodemod on `filename` and return the new code.
+
+    Never raises and never writes to disk; failures are reported on the result.
+    With a `cache`, files whose content was already codemodded with the same renames
+    are not parsed again. Files that a cheap stdlib `ast` scan shows do not import
+    any of `olds` are not parsed with libcst at all. `data` overrides the content of
+    the file, for worker processes that cannot see the parent's uncommitted changes.
+    The file is decoded as its coding cookie says, like Python does.
+
+    >>> codemod_file("a/b.py", ["a.c"], ["x.y"])
+    CodemodResult(filename='a/b.py', changed=True, code='...', error=None)
+    """
+    path = pathlib.Path(filename)
+    spans: List[timing.Span] = []
+    try:
+        with timing.span(spans, "read"):
+            old_code, encoding = fs.decode(fs.read_bytes(path) if data is None else data)
+        module = calculate_module_and_package(ROOT_DIR, path.resolve())
+        prepared = renames(tuple(olds), tuple(news))
+        if cache is not None:
+            key = cache.key(prepared.key, module.name, module.package, old_code)
+            hit = cache.get(key)
+            if hit is not None:
+                changed, code = hit
+                return CodemodResult(
+                    filename,
+                    changed=changed,
+                    code=code,
+                    encoding=encoding,
+                    cached=True,
+                    spans=spans,
+                )
+        with timing.span(spans, "prefilter"):
+            imported = prepared.module_set.may_be_imported(
+                module.name, filename, old_code
+            )
+        if not imported:
+            return CodemodResult(filename, spans=spans)
+        context = CodemodContext(
+            filename=filename,
+            full_module_name=module.name,
+            full_package_name=module.package,
+        )
+        transformer = ReplaceImportCodemod(
+            context, prepared.old, prepared.new, None, prepared.pair_trie
+        )
+        with timing.span(spans, "parse"):
+            tree = parse(old_code)
+        tree = transformer.transform_module(tree)
+        spans.extend(transformer.spans)
+        with timing.span(spans, "render"):
+            new_code = tree.code
+    except Exception:
+        return CodemodResult(filename, error=traceback.format_exc(), spans=spans)
+
+    changed = new_code != old_code
+    cache_bytes = 0
+    if cache is not None:
+        cache_bytes = cache.set(key, changed, new_code if changed else None)
+    if not changed:
+        return CodemodResult(filename, spans=spans, cache_bytes=cache_bytes)
+    return CodemodResult(
+        filename,
+        changed=True,
+        code=new_code,
+        encoding=encoding,
+        spans=spans,
+        cache_bytes=cache_bytes,
+    )
+
+
+def codemod_file_streaming(
+    filename: str,
+    olds: Sequence[str],
+    news: Sequence[str],
+    cache: Optional[ResultCache] = None,
+    data: Optional[bytes] = None,
+) -> CodemodResult:
+    """`codemod_file`, then free the tree, metadata and scratch of the file.
+
+    They hold reference cycles, so without a collection they can pile up over many
+    files before the garbage collector gets to them.
+    """
+    result = codemod_file(filename, olds, news, cache, data)
+    gc.collect()
+    result.rss = memory.rss()
+    return result
+
+
+# Parsed modules by source code, most recently used last. Only used when enabled
+# with `enable_parse_cache`, by the `refac serve` daemon.
+_parse_cache: "OrderedDict[str, Module]" = OrderedDict()
+_parse_cache_size = 0
+
+
+def enable_parse_cache(size: int) -> None:
+    """Keep the trees of the last `size` parsed files in memory for reuse."""
+    global _parse_cache_size
+    _parse_cache_size = size
+    while len(_parse_cache) > size:
+        _parse_cache.popitem(last=False)
+
+
+def parse(code: str) -> Module:
+    """Parse `code` with libcst, reusing an earlier tree of identical code if cached.
+
+    Reusing a tree is safe because libcst trees are immutable, and codemods copy the
+    tree before resolving metadata. Nothing is cached under a memory limit.
+    """
+    if _parse_cache_size <= 0 or memory.max_memory() is not None:
+        return parse_module(code)
+    tree = _parse_cache.get(code)
+    if tree is None:
+        tree = _parse_cache[code] = parse_module(code)
+        if len(_parse_cache) > _parse_cache_size:
+            _parse_cache.popitem(last=False)
+    else:
+        _parse_cache.move_to_end(code)
+    return tree
+
+
+class Renames:
+    """What every file of a move needs from its renames, prepared once per process.
+
+    With thousands of renames, parsing them into a `PairTrie` takes longer than
+    codemodding a typical file.
+    """
+
+    def __init__(self, olds: Tuple[str, ...], news: Tuple[str, ...]) -> None:
+        self.old = ",".join(olds)
+        self.new = ",".join(news)
+        self.key = pairs_key(olds, news)
+        self.module_set = ModuleSet(old.strip() for old in olds)
+        self.pair_trie = PairTrie.parse(CodemodContext(), self.old, self.new, None)
+
+
+@functools.lru_cache(maxsize=8)
+def renames(olds: Tuple[str, ...], news: Tuple[str, ...]) -> Renames:
+    return Renames(olds, news)
+
+
+def codemod_imports(
+    olds: Sequence[str], news: Sequence[str], jobs: int = 1
+) -> List[CodemodResult]:
+    """Execute ReplaceImportCodemod to rename `olds` to `news` across the repo.
+
+    For performance, we only apply the codemod to files that import one of `olds`,
+    according to the import index, and reuse cached results for files that were
+    already codemodded with the same renames.
+    """
+    with timing.phase("find"):
+        filenames = files_importing(olds, jobs=jobs)
+    cache = ResultCache()
+    results = codemod_files(filenames, olds, news, jobs=jobs, cache=cache)
+    added = sum(r.cache_bytes for r in results)
+    if added:
+        cache.prune(added)
+    return results
+
+
+def codemod_files(
+    filenames: Sequence[str],
+    olds: Sequence[str],
+    news: Sequence[str],
+    jobs: int = 1,
+    cache: Optional[ResultCache] = None,
+) -> List[CodemodResult]:
+    """Run ReplaceImportCodemod on each of `filenames`, writing back changed files.
+
+    With `jobs > 1` enough files are spread over a pool of worker processes, unless
+    the parse cache is enabled, since it only lives in this process. Under a memory
+    limit (see `refac.memory`), each file is written to the change set as soon as it
+    is done, which keeps it in a temp file, and its new code is not kept on the
+    result.
+    """
+    streaming = memory.max_memory() is not None
+    results: List[CodemodResult] = []
+    with timing.phase("codemod"):
+        if jobs > 1 and _parse_cache_size <= 0 and worth_a_pool(filenames):
+            done = parallel_codemod_files(filenames, olds, news, jobs, cache)
+        else:
+            task = codemod_file_streaming if streaming else codemod_file
+            done = (task(filename, olds, news, cache) for filename in filenames)
+        for result in done:
+            timing.add_file(result.filename, result.spans, result.pid)
+            timing.add_memory(result.pid, result.max_rss)
+            if result.changed:
+                fs.write_text(
+                    pathlib.Path(result.filename),
+                    result.code,  # type: ignore[arg-type]
+                    result.encoding,
+                )
+                if streaming:
+                    result.code = None
+            results.append(result)
+    order = {filename: i for i, filename in enumerate(filenames)}
+    results.sort(key=lambda r: order[r.filename])
+    report(results)
+    return results
+
+
+def parallel_codemod_files(
+    filenames: Sequence[str],
+    olds: Sequence[str],
+    news: Sequence[str],
+    jobs: int,
+    cache: Optional[ResultCache] = None,
+) -> Iterator[CodemodResult]:
+    """Run `codemod_file` over a process pool, yielding results as they complete.
+
+    Every file is its own task on the pool's shared queue, so an idle worker always
+    picks up the next pending file. Tasks are queued largest file first, so a few
+    huge files start early instead of holding up the tail of the run.
+
+    Under a memory limit, only one file per worker is queued at a time, and one
+    worker fewer is used every time refac and its workers get near the limit, and
+    one more again once they are well under it. The pool is then replaced by one of
+    the new size, and the workers of the old pool exit once their files are done.
+    """
+    streaming = memory.max_memory() is not None
+    pending = sorted(filenames, key=file_size)
+    max_workers = workers = min(jobs, len(filenames))
+    initargs = (tuple(olds), tuple(news), cache, streaming)
+    # Memory used by each live worker after its last file.
+    worker_rss: Dict[int, int] = {}
+    futures: Dict[Future, str] = {}
+    # The pool of each pending future, and the workers that each pool has used.
+    future_pools: Dict[Future, ProcessPoolExecutor] = {}
+    pool_pids: Dict[ProcessPoolExecutor, Set[int]] = {}
+    executor = worker_pool(workers, initargs)
+    pools = [executor]
+    try:
+        while pending or futures:
+            while pending and (not streaming or len(futures) < workers):
+                filename = pending.pop()
+                future = executor.submit(
+                    worker_codemod_file, filename, fs.buffered_bytes(filename)
+                )
+                futures[future] = filename
+                future_pools[future] = executor
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                filename = futures.pop(future)
+                pool = future_pools.pop(future)
+                try:
+                    result = future.result()
+                except Exception:
+                    yield CodemodResult(filename, error=traceback.format_exc())
+                    continue
+                worker_rss[result.pid] = result.rss
+                pool_pids.setdefault(pool, set()).add(result.pid)
+                yield result
+            if not streaming:
+                continue
+            # Workers of a replaced pool have exited once its last file is done.
+            for pool in pools[:-1]:
+                if pool in pool_pids and pool not in future_pools.values():
+                    for pid in pool_pids.pop(pool):
+                        worker_rss.pop(pid, None)
+            used = memory.rss() + sum(worker_rss.values())
+            if workers > 1 and memory.is_near_limit(used):
+                workers -= 1
+                print(
+                    f"Using {memory.format_size(used)} of memory, near the limit. "
+                    f"Lowering the number of workers to {workers}.",
+                    file=sys.stderr,
+                )
+            elif workers < max_workers and memory.is_well_under_limit(used):
+                workers += 1
+                print(
+                    f"Using {memory.format_size(used)} of memory, well under the limit. "
+                    f"Raising the number of workers to {workers}.",
+                    file=sys.stderr,
+                )
+            else:
+                continue
+            executor.shutdown(wait=False)
+            executor = worker_pool(workers, initargs)
+            pools.append(executor)
+    finally:
+        for pool in pools:
+            pool.shutdown()
+
+
+def worker_pool(workers: int, initargs: Tuple) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=initargs
+    )
+
+
+# The renames, cache and streaming flag of the run, set in each worker process by
+# `init_worker` so that they are sent once per worker instead of once per file.
+_worker_args: Tuple = ()
+
+
+def init_worker(
+    olds: Tuple[str, ...],
+    news: Tuple[str, ...],
+    cache: Optional[ResultCache],
+    streaming: bool,
+) -> None:
+    global _worker_args
+    _worker_args = (olds, news, cache, streaming)
+
+
+def worker_codemod_file(filename: str, data: Optional[bytes]) -> CodemodResult:
+    """`codemod_file` in a worker process, with the arguments from `init_worker`."""
+    olds, news, cache, streaming = _worker_args
+    task = codemod_file_streaming if streaming else codemod_file
+    return task(filename, olds, news, cache, data)
+
+
+def worth_a_pool(filenames: Sequence[str]) -> bool:
+    """True if there are enough `filenames` to pay for starting worker processes."""
+    if len(filenames) < 2:
+        return False
+    return (
+        len(filenames) >= PARALLEL_MIN_FILES
+        or sum(map(file_size, filenames)) >= PARALLEL_MIN_BYTES
+    )
+
+
+def file_size(filename: str) -> int:
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+def report(results: List[CodemodResult]) -> None:
+    changed = sum(1 for r in results if r.changed)
+    cached = sum(1 for r in results if r.cached)
+    failed = [r for r in results if r.error is not None]
+    for result in failed:
+        print(f"Failed to codemod {result.filename}:\n{result.error}", file=sys.stderr)
+    print(
+        f"Updated imports in {changed} of {len(results)} files ({cached} cached, {len(failed)} failed).\n"
+    )
@@ -0,0 +1,176 @@
+"""
+Keep refac warm in a long-running process with `refac serve`.
+
+The daemon listens on a Unix socket in the cache dir of the repo. While it is running,
+`refac file|symbol|import|plan` send their arguments to it and stream back its output
+instead of importing libcst, loading the import index and parsing files from scratch.
+
+The daemon keeps the import index, the module map and recently parsed files in memory.
+It codemods files in its own process to reuse them, whatever `--jobs` the client asks for.
+Before every request it refreshes the import index, which only re-scans files whose
+content changed since the last request, and rebuilds the module map if any Python
+file was added, changed or removed.
+
+Requests and responses are JSON lines:
+
+    -> {"version": "0.0.5", "cwd": "/repo", "argv": ["symbol", "a.Foo", "b.Foo"]}
+    <- {"stdout": "Updated imports in 3 of 3 files ..."}
+    <- {"exit": 0}
+"""
+
+import contextlib
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+from typing import Any, Dict, List, Optional
+
+from refac import __version__
+from refac.utils import CACHE_DIR, ROOT_DIR
+
+SOCKET_PATH = CACHE_DIR / "daemon.sock"
+
+# Number of parsed files the daemon keeps in memory.
+PARSE_CACHE_SIZE = 256
+
+
+def request(argv: List[str]) -> Optional[int]:
+    """Run `refac <argv>` in the daemon, if one is running for this repo.
+
+    Returns the exit code, or None if there is no daemon to talk to.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(SOCKET_PATH))
+    except OSError:
+        client.close()
+        return None
+
+    with client, client.makefile("rwb") as stream:
+        message = {"version": __version__, "cwd": os.getcwd(), "argv": argv}
+        stream.write(json.dumps(message).encode() + b"\n")
+        stream.flush()
+        received = False
+        for line in stream:
+            received = True
+            response: Dict[str, Any] = json.loads(line)
+            if "stdout" in response:
+                sys.stdout.write(response["stdout"])
+                sys.stdout.flush()
+            elif "stderr" in response:
+                sys.stderr.write(response["stderr"])
+                sys.stderr.flush()
+            elif "exit" in response:
+                return response["exit"]
+    if not received:
+        # The daemon runs another version of refac.
+        return None
+    print("The refac daemon stopped before finishing the request.", file=sys.stderr)
+    return 1
+
+
+class StreamWriter:
+    """File-like object that forwards everything written to it to the client."""
+
+    def __init__(self, stream: Any, name: str) -> None:
+        self.stream = stream
+        self.name = name
+
+    def write(self, text: str) -> int:
+        if text:
+            self.stream.write(json.dumps({self.name: text}).encode() + b"\n")
+        return len(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            # A client checking whether the daemon is running.
+            return
+        message = json.loads(line)
+        if message.get("version") != __version__:
+            # Let the client run the command itself with its own version of refac.
+            return
+
+        stdout = StreamWriter(self.wfile, "stdout")
+        stderr = StreamWriter(self.wfile, "stderr")
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):  # type: ignore[type-var]
+                try:
+                    os.chdir(message["cwd"])
+                    exit_code = run(message["argv"])
+                except ConnectionError:
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    exit_code = 1
+                finally:
+                    os.chdir(ROOT_DIR)
+            self.wfile.write(json.dumps({"exit": exit_code}).encode() + b"\n")
+        except ConnectionError:
+            # The client went away, e.g. `refac ... --dry-run | head`.
+            pass
+
+
+def run(argv: List[str]) -> int:
+    """Run `refac <argv>` in this process with warm state, returning the exit code."""
+    from refac import main
+
+    refresh()
+    try:
+        main([*argv, "--no-daemon"])
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else int(e.code is not None)
+    return 0
+
+
+def refresh() -> None:
+    """Bring the in-memory state up to date with changes made outside of refac."""
+    from refac.import_index import refresh_index
+    from refac.module_map import module_map
+
+    if refresh_index():
+        module_map.cache_clear()
+    module_map()
+
+
+def serve() -> None:
+    """Run the daemon for the repo at $ROOT_DIR until interrupted or terminated."""
+    from refac.codemod import enable_parse_cache
+
+    if request_is_served():
+        raise Exception(f"A refac daemon is already listening on {SOCKET_PATH}.")
+    with contextlib.suppress(FileNotFoundError):
+        SOCKET_PATH.unlink()
+    SOCKET_PATH.parent.mkdir(parents=True, exist_ok=True)
+
+    # Stop on `kill` the same way as on Ctrl+C, removing the socket.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    enable_parse_cache(PARSE_CACHE_SIZE)
+    refresh()
+    with socketserver.UnixStreamServer(str(SOCKET_PATH), RequestHandler) as server:
+        print(f"Listening on {SOCKET_PATH}. Press Ctrl+C to stop.\n")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                SOCKET_PATH.unlink()
+
+
+def request_is_served() -> bool:
+    """True if something is listening on the socket."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(SOCKET_PATH))
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,388 @@
+"""
+File access for every step of a move, buffered in memory and committed at the end.
+
+Inside `transaction()`, writes and deletions are collected in a `ChangeSet` instead of
+going to disk, and reads see them. When the block finishes, the change set is
+committed: only files whose bytes differ from disk are written, each through a temp
+file and a rename, so a move that fails part way never leaves half-edited files.
+
+`dry_run()` collects a change set the same way but never commits it, and `diff`
+renders it as a unified diff against what is on disk.
+
+Under a memory limit (see `refac.memory`), the new content of each file is kept in
+a temp file instead of in memory until the change set is committed.
+
+    >>> with dry_run():
+    ...     move_file(["a/b.py"], ["x/y.py"])
+    ...     sys.stdout.writelines(diff(ROOT_DIR))
+"""
+
+import contextlib
+import difflib
+import io
+import os
+import pathlib
+import shutil
+import tempfile
+import tokenize
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from refac import memory, timing
+
+
+class ChangeSet:
+    """Files written or deleted during a move, by absolute path."""
+
+    def __init__(self, spill: bool = False) -> None:
+        # The new content of each file, or None if the file was deleted.
+        self.files: Dict[pathlib.Path, Optional[bytes]] = {}
+        # With `spill`, the temp file holding the new content of each written file.
+        self.spilled: Dict[pathlib.Path, pathlib.Path] = {}
+        self.spill_dir = pathlib.Path(tempfile.mkdtemp(prefix="refac-")) if spill else None
+        # Directories moved away with `move_tree`, removed on commit once empty.
+        self.trees: Set[pathlib.Path] = set()
+
+    def __contains__(self, path: pathlib.Path) -> bool:
+        return path in self.files or path in self.spilled
+
+    def paths(self) -> List[pathlib.Path]:
+        """All written or deleted paths, sorted."""
+        return sorted(self.files.keys() | self.spilled.keys())
+
+    def exists(self, path: pathlib.Path) -> bool:
+        """Whether `path`, which must be in the change set, was written."""
+        return path in self.spilled or self.files[path] is not None
+
+    def get(self, path: pathlib.Path) -> Optional[bytes]:
+        """The new content of `path`, or None if it was deleted."""
+        if path in self.spilled:
+            return self.spilled[path].read_bytes()
+        return self.files[path]
+
+    def set(self, path: pathlib.Path, data: Optional[bytes]) -> None:
+        self.files.pop(path, None)
+        spill = self.spilled.pop(path, None)
+        if spill is not None:
+            spill.unlink()
+        if data is None or self.spill_dir is None:
+            self.files[path] = data
+            return
+        fd, name = tempfile.mkstemp(dir=self.spill_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        self.spilled[path] = pathlib.Path(name)
+
+    def close(self) -> None:
+        """Remove the temp files of the change set."""
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def commit(self) -> List[pathlib.Path]:
+        """Apply the changes to disk, returning the paths that actually changed.
+
+        All new content is written to temp files next to their targets before any
+        target is touched, then each temp file is renamed over its target.
+        """
+        writes: List[Tuple[pathlib.Path, pathlib.Path]] = []
+        deletes: List[pathlib.Path] = []
+        try:
+            for path in self.paths():
+                data = self.get(path)
+                if data == read_disk(path):
+                    continue
+                if data is None:
+                    deletes.append(path)
+                else:
+                    writes.append((temp_file(path, data), path))
+        except BaseException:
+            for tmp, _ in writes:
+                tmp.unlink(missing_ok=True)
+            raise
+
+        for tmp, path in writes:
+            os.replace(tmp, path)
+        for path in deletes:
+            path.unlink(missing_ok=True)
+        for tree in self.trees:
+            remove_empty_dirs(tree)
+        return sorted([path for _, path in writes] + deletes)
+
+
+# The change set of the current transaction or dry run, or None when writing to disk.
+_changes: Optional[ChangeSet] = None
+
+
+@contextlib.contextmanager
+def dry_run() -> Iterator[ChangeSet]:
+    """Keep all writes and deletions in a change set and never commit them."""
+    global _changes
+    changes = ChangeSet(spill=memory.max_memory() is not None)
+    previous, _changes = _changes, changes
+    try:
+        yield changes
+    finally:
+        _changes = previous
+        changes.close()
+
+
+@contextlib.contextmanager
+def transaction() -> Iterator[None]:
+    """Buffer all writes and deletions until the end of the block, then commit them.
+
+    Nothing is written if the block raises. Inside another transaction or a dry run,
+    the changes become part of the outer one.
+    """
+    if _changes is not None:
+        yield
+        return
+    with dry_run() as changes:
+        yield
+        with timing.phase("commit"):
+            changes.commit()
+
+
+def is_buffered() -> bool:
+    return _changes is not None
+
+
+def key(path: pathlib.Path) -> pathlib.Path:
+    return pathlib.Path(path).resolve()
+
+
+def read_bytes(path: pathlib.Path) -> bytes:
+    if _changes is not None:
+        k = key(path)
+        if k in _changes:
+            data = _changes.get(k)
+            if data is None:
+                raise FileNotFoundError(f"File {path} was deleted.")
+            return data
+    return pathlib.Path(path).read_bytes()
+
+
+def read_text(path: pathlib.Path) -> str:
+    """The Python source in `path`, decoded as its coding cookie says."""
+    return decode(read_bytes(path))[0]
+
+
+def decode(data: bytes) -> Tuple[str, str]:
+    """The source code in `data` and its encoding, from a coding cookie or else UTF-8.
+
+    >>> decode(b"# -*- coding: latin-1 -*-\\ns = '\\xe9'\\n")
+    ("# -*- coding: latin-1 -*-\\ns = 'é'\\n", "iso-8859-1")
+    """
+    encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+    return data.decode(encoding), encoding
+
+
+def declared_encoding(text: str) -> str:
+    """The encoding the coding cookie of the source `text` declares, or else UTF-8."""
+    # Like Python, only look for the cookie on the first two lines.
+    first = text.find("\n")
+    end = -1 if first < 0 else text.find("\n", first + 1)
+    head = text if end < 0 else text[: end + 1]
+    try:
+        encoding, _ = tokenize.detect_encoding(
+            io.BytesIO(head.encode(errors="replace")).readline
+        )
+    except SyntaxError:
+        return "utf-8"
+    return encoding
+
+
+def buffered_bytes(path: pathlib.Path) -> Optional[bytes]:
+    """The new content of `path` if it was written in the current change set."""
+    if _changes is None:
+        return None
+    k = key(path)
+    return _changes.get(k) if k in _changes else None
+
+
+def write_bytes(path: pathlib.Path, data: bytes) -> None:
+    """Write `path`, outside of a transaction only if its content changes."""
+    if _changes is not None:
+        _changes.set(key(path), data)
+        return
+    path = pathlib.Path(path)
+    if read_disk(path) != data:
+        os.replace(temp_file(path, data), path)
+
+
+def write_text(path: pathlib.Path, text: str, encoding: Optional[str] = None) -> None:
+    """Write the Python source `text` to `path`.
+
+    `encoding` defaults to the one declared by the coding cookie of `text`, which is
+    how Python will read the file back.
+    """
+    write_bytes(path, text.encode(encoding or declared_encoding(text)))
+
+
+def delete(path: pathlib.Path) -> None:
+    if _changes is not None:
+        _changes.set(key(path), None)
+        return
+    pathlib.Path(path).unlink()
+
+
+def is_file(path: pathlib.Path) -> bool:
+    if _changes is not None:
+        k = key(path)
+        if k in _changes:
+            return _changes.exists(k)
+    return pathlib.Path(path).is_file()
+
+
+def is_dir(path: pathlib.Path) -> bool:
+    if _changes is not None:
+        k = key(path)
+        under = [p for p in _changes.paths() if k in p.parents]
+        if any(_changes.exists(p) for p in under):
+            return True
+        if not pathlib.Path(path).is_dir():
+            return False
+        # A directory whose files were all deleted is gone, like after `rmtree`.
+        deleted = len(under) > 0
+        return not deleted or len(files_under(path)) > 0
+    return pathlib.Path(path).is_dir()
+
+
+def exists(path: pathlib.Path) -> bool:
+    return is_file(path) or is_dir(path)
+
+
+def files_under(path: pathlib.Path) -> List[pathlib.Path]:
+    """Absolute paths of all files under the directory `path`."""
+    root = key(path)
+    files = set()
+    for dirpath, _, filenames in os.walk(root):
+        files.update(pathlib.Path(dirpath) / filename for filename in filenames)
+    if _changes is not None:
+        for p in _changes.paths():
+            if root in p.parents:
+                if _changes.exists(p):
+                    files.add(p)
+                else:
+                    files.discard(p)
+    return sorted(files)
+
+
+def changes() -> Iterator[Tuple[pathlib.Path, Optional[bytes]]]:
+    """The files written or deleted (None) in the current change set."""
+    if _changes is None:
+        return
+    for path in _changes.paths():
+        yield path, _changes.get(path)
+
+
+def move_tree(old_path: pathlib.Path, new_path: pathlib.Path) -> None:
+    """Move the contents of directory `old_path` into `new_path`.
+
+    May overwrite files in the new directory if they have the same name as files in
+    the old directory.
+    """
+    with transaction():
+        assert _changes is not None
+        old_root, new_root = key(old_path), key(new_path)
+        for path in files_under(old_root):
+            write_bytes(new_root / path.relative_to(old_root), read_bytes(path))
+            delete(path)
+        _changes.trees.add(old_root)
+
+
+def list_files(
+    root: pathlib.Path, filenames: Iterable[str], suffix: str = ""
+) -> List[str]:
+    """Update a listing of files relative to `root` with the current change set.
+
+    Deleted files are dropped and new files ending with `suffix` are added.
+    """
+    if _changes is None:
+        return list(filenames)
+    root = key(root)
+    files = set(filenames)
+    for path in _changes.paths():
+        if root not in path.parents:
+            continue
+        filename = str(path.relative_to(root))
+        if not _changes.exists(path):
+            files.discard(filename)
+        elif filename.endswith(suffix):
+            files.add(filename)
+    return sorted(files)
+
+
+def read_disk(path: pathlib.Path) -> Optional[bytes]:
+    try:
+        return path.read_bytes()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def temp_file(path: pathlib.Path, data: bytes) -> pathlib.Path:
+    """Write `data` to a new file next to `path`, keeping the permissions of `path`."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with tmp.open("wb") as f:
+            f.write(data)
+        with contextlib.suppress(FileNotFoundError):
+            os.chmod(tmp, path.stat().st_mode & 0o7777)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return tmp
+
+
+def remove_empty_dirs(root: pathlib.Path) -> None:
+    """Remove `root` and the directories under it that contain no files."""
+    for dirpath, _, _ in os.walk(root, topdown=False):
+        with contextlib.suppress(OSError):
+            os.rmdir(dirpath)
+
+
+def diff(root: pathlib.Path) -> Iterator[str]:
+    """Yield a git-style unified diff of the current change set, one file at a time.
+
+    The extended headers (`new file mode`, `deleted file mode`) let `git apply` create
+    and delete empty files, which a plain unified diff cannot express.
+    """
+    if _changes is None:
+        return
+    root = key(root)
+    for path in _changes.paths():
+        new = _changes.get(path)
+        try:
+            old: Optional[bytes] = path.read_bytes()
+            mode = f"{path.stat().st_mode:o}"
+        except OSError:
+            old, mode = None, "100644"
+        if old == new:
+            continue
+        name = str(path.relative_to(root)) if root in path.parents else str(path)
+        header = f"diff --git a/{name} b/{name}\n"
+        if old is None:
+            header += f"new file mode {mode}\n"
+        elif new is None:
+            header += f"deleted file mode {mode}\n"
+        old_name = f"a/{name}" if old is not None else "/dev/null"
+        new_name = f"b/{name}" if new is not None else "/dev/null"
+        if b"\0" in (old or b"") or b"\0" in (new or b""):
+            yield f"{header}Binary files {old_name} and {new_name} differ\n"
+            continue
+        yield header + "".join(
+            difflib.unified_diff(
+                lines(old),
+                lines(new),
+                fromfile=old_name,
+                tofile=new_name,
+            )
+        )
+
+
+def lines(data: Optional[bytes]) -> List[str]:
+    if data is None:
+        return []
+    result = data.decode(errors="replace").splitlines(keepends=True)
+    if result and not result[-1].endswith("\n"):
+        result[-1] += "\n\\ No newline at end of file\n"
+    return result
@@ -0,0 +1,314 @@
+"""
+Persistent index of which files import which modules.
+
+Used in place of `git grep`-ing for the last part of a module name, which matches most
+of the repo for names like `utils`, `models` or `base`.
+"""
+
+import ast
+import bisect
+import functools
+import os
+import pathlib
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import (
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from libcst.helpers import calculate_module_and_package
+
+from refac import fs, timing
+from refac.utils import CACHE_DIR, ROOT_DIR, git_ls_files
+from refac.visitors.import_utils import get_absolute_module_for_ast_import
+
+# A git blob hash, or (mtime, size) for files that differ from the git index.
+Stamp = Union[str, Tuple[int, int]]
+
+# Stands in for the imports of a file that could not be scanned, e.g. because it uses
+# syntax newer than this Python. It matches every module, so such files are always
+# codemodded, like `git grep` would have found them.
+UNKNOWN = "<unknown>"
+
+# Below this many stale files, scanning them in-process is faster than starting a
+# pool of workers.
+PARALLEL_MIN_FILES = 256
+
+
+def iter_import_nodes(tree: ast.Module) -> Iterator[ast.stmt]:
+    """Yield every `ast.Import` and `ast.ImportFrom` node, including nested ones.
+
+    Only statements are walked; imports can never appear inside an expression.
+    """
+    stack: List[ast.AST] = list(tree.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            yield node
+            continue
+        for field in ("body", "orelse", "finalbody", "handlers", "cases"):
+            children = getattr(node, field, None)
+            if isinstance(children, list):
+                stack.extend(children)
+
+
+def scan_imports(filename: str, source: Union[str, bytes]) -> FrozenSet[str]:
+    """Absolute names imported by the Python `source` of `filename` (relative to $ROOT_DIR).
+
+    >>> scan_imports("a/b.py", "import x.y; from z import w; from . import c")
+    frozenset({"x.y", "z.w", "a.c"})
+
+    A `source` in bytes is decoded as its coding cookie says, like the codemod does.
+    Sources that `ast` cannot parse or decode import `UNKNOWN`.
+    """
+    try:
+        tree = ast.parse(source, filename)
+    except (SyntaxError, ValueError):
+        return frozenset({UNKNOWN})
+    full_module_name = calculate_module_and_package(ROOT_DIR, ROOT_DIR / filename).name
+    return imported_names(full_module_name, filename, tree)
+
+
+def imported_names(
+    full_module_name: str, filename: str, tree: ast.Module
+) -> FrozenSet[str]:
+    names: Set[str] = set()
+    for node in iter_import_nodes(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            module = get_absolute_module_for_ast_import(full_module_name, filename, node)
+            if module is None:
+                continue
+            names.update(
+                f"{module}.{alias.name}" for alias in node.names if alias.name != "*"
+            )
+    return frozenset(names)
+
+
+class ModuleSet:
+    """Answers whether an imported name may refer to one of `modules`.
+
+    An imported name `n` matches a module `m` if `n` is `m`, is under `m` (`m.x`), or
+    is a parent that `m` can be reached through (`import a` for `a.b`). This is the
+    same rule `ImportIndex.files_importing` uses, checked in time proportional to the
+    depth of `n` rather than the number of modules. `UNKNOWN` matches every module.
+    """
+
+    def __init__(self, modules: Iterable[str]) -> None:
+        self.modules: Set[str] = set()
+        self.prefixes: Set[str] = set()
+        for module in modules:
+            self.modules.add(module)
+            parts = module.split(".")
+            self.prefixes.update(".".join(parts[:i]) for i in range(1, len(parts) + 1))
+
+    def matches(self, name: str) -> bool:
+        if name in self.prefixes or name == UNKNOWN:
+            return True
+        parts = name.split(".")
+        return any(".".join(parts[:i]) in self.modules for i in range(1, len(parts)))
+
+    def may_be_imported(self, full_module_name: str, filename: str, source: str) -> bool:
+        """False only if a stdlib `ast` scan proves `source` imports none of the modules.
+
+        Files that `ast` cannot parse are assumed to match.
+        """
+        try:
+            tree = ast.parse(source, filename)
+        except (SyntaxError, ValueError):
+            return True
+        names = imported_names(full_module_name, filename, tree)
+        return any(self.matches(name) for name in names)
+
+
+def scan_file(filename: str) -> FrozenSet[str]:
+    path = ROOT_DIR / filename
+    try:
+        source = path.read_bytes()
+    except OSError:
+        return frozenset()
+    return scan_imports(filename, source)
+
+
+def file_stamps() -> Dict[str, Stamp]:
+    """A stamp for every Python file in the repo that changes whenever its content does.
+
+    Files that are unchanged from the git index are stamped with their blob hash, which
+    `git ls-files --stage` reads straight from the index without touching the files.
+    Modified and untracked files are stamped with their mtime and size instead.
+    """
+    stamps: Dict[str, Stamp] = {}
+    for line in git_ls_files("--stage", "--", "*.py"):
+        info, filename = line.split("\t", 1)
+        _, blob, _ = info.split(" ")
+        stamps[filename] = blob
+
+    for filename in git_ls_files(
+        "--modified", "--others", "--exclude-standard", "--", "*.py"
+    ):
+        try:
+            stat = os.stat(ROOT_DIR / filename)
+        except OSError:
+            # Deleted from the working tree, but not yet from the git index.
+            stamps.pop(filename, None)
+            continue
+        stamps[filename] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+class ImportIndex:
+    """Maps modules to the files that import them.
+
+    Each file's imports are stored with a stamp of the file (see `file_stamps`), so
+    `refresh` only has to re-scan files whose content changed since the index was last
+    saved. Switching branches back and forth re-scans nothing, since blob hashes only
+    depend on content.
+    """
+
+    VERSION = 4
+
+    def __init__(self, path: Optional[pathlib.Path] = None) -> None:
+        self.path = path or CACHE_DIR / "import_index.pickle"
+        self.files: Dict[str, Tuple[Stamp, FrozenSet[str]]] = {}
+        self._importers: Optional[Dict[str, Set[str]]] = None
+        self._names: List[str] = []
+
+    @classmethod
+    def load(cls, path: Optional[pathlib.Path] = None) -> "ImportIndex":
+        index = cls(path)
+        try:
+            with index.path.open("rb") as f:
+                version, files = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            return index
+        if version == cls.VERSION:
+            index.files = files
+        return index
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            pickle.dump((self.VERSION, self.files), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def refresh(self, jobs: int = 1) -> int:
+        """Re-scan files that were added or changed and drop deleted files.
+
+        Returns the number of files that were added, changed or deleted.
+        """
+        stamps = file_stamps()
+        stale = [
+            filename
+            for filename, stamp in stamps.items()
+            if filename not in self.files or self.files[filename][0] != stamp
+        ]
+        deleted = self.files.keys() - stamps.keys()
+        if not stale and not deleted:
+            return 0
+
+        if jobs > 1 and len(stale) >= PARALLEL_MIN_FILES:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                scanned = list(executor.map(scan_file, stale, chunksize=64))
+        else:
+            scanned = [scan_file(filename) for filename in stale]
+
+        files = {
+            filename: self.files[filename]
+            for filename in stamps.keys() & self.files.keys()
+        }
+        files.update(
+            (filename, (stamps[filename], names))
+            for filename, names in zip(stale, scanned)
+        )
+        self.files = files
+        self._importers = None
+        return len(stale) + len(deleted)
+
+    def files_importing(self, modules: Iterable[str]) -> List[str]:
+        """Absolute paths of files that may reference any of `modules`.
+
+        A file matches `a.b` if it imports `a.b` itself, a submodule or symbol under
+        `a.b` (e.g. `a.b.c`), or a parent of `a.b` that usages can reach it through
+        (e.g. `from a import b` or `import a`).
+        """
+        importers = self.importers()
+        matches: Set[str] = set(importers.get(UNKNOWN, ()))
+        for module in modules:
+            parts = module.split(".")
+            for i in range(1, len(parts) + 1):
+                matches.update(importers.get(".".join(parts[:i]), ()))
+            start = bisect.bisect_left(self._names, module + ".")
+            end = bisect.bisect_left(self._names, module + "/")
+            for name in self._names[start:end]:
+                matches.update(importers[name])
+        return sorted(str(ROOT_DIR / filename) for filename in matches)
+
+    def importers(self) -> Dict[str, Set[str]]:
+        """Reverse mapping of imported name to the files that import it."""
+        if self._importers is None:
+            importers: Dict[str, Set[str]] = {}
+            for filename, (_, names) in self.files.items():
+                for name in names:
+                    importers.setdefault(name, set()).add(filename)
+            self._importers = importers
+            self._names = sorted(importers)
+        return self._importers
+
+
+@functools.lru_cache(maxsize=1)
+def loaded_index() -> ImportIndex:
+    """The on-disk index, loaded once per process and kept in memory after that."""
+    return ImportIndex.load()
+
+
+def refresh_index(jobs: int = 1) -> int:
+    """Refresh the in-memory index, saving it to disk if anything changed."""
+    index = loaded_index()
+    changed = index.refresh(jobs=jobs)
+    if changed:
+        index.save()
+    return changed
+
+
+def files_importing(modules: Iterable[str], jobs: int = 1) -> List[str]:
+    """Refresh the index and list the files that may reference `modules`."""
+    with timing.step("refresh index"):
+        refresh_index(jobs=jobs)
+    with timing.step("look up importers"):
+        modules = list(modules)
+        filenames = loaded_index().files_importing(modules)
+        if fs.is_buffered():
+            filenames = files_importing_in_change_set(filenames, modules)
+    return filenames
+
+
+def files_importing_in_change_set(
+    filenames: List[str], modules: List[str]
+) -> List[str]:
+    """Correct `filenames` from the on-disk index for files changed but not committed.
+
+    Deleted files are dropped, and written files are scanned again from memory.
+    """
+    root = fs.key(ROOT_DIR)
+    module_set = ModuleSet(modules)
+    matches = {filename for filename in filenames if fs.is_file(filename)}
+    for path, data in fs.changes():
+        if data is None or path.suffix != ".py" or root not in path.parents:
+            continue
+        names = scan_imports(str(path.relative_to(root)), data)
+        filename = str(ROOT_DIR / path.relative_to(root))
+        if any(module_set.matches(name) for name in names):
+            matches.add(filename)
+        else:
+            matches.discard(filename)
+    return sorted(matches)
@@ -0,0 +1,97 @@
+"""
+Memory use of refac and its worker processes, to keep moves in huge repos in bounds.
+
+Inside `limit()`, codemods stream: every file's new code goes to a temp file of the
+change set (see `refac.fs`) as soon as it is ready instead of being kept in memory
+until the move is committed, workers collect garbage after each file, and fewer
+files are codemodded at once while the memory used by refac and its workers is near
+the limit.
+
+    >>> with limit(parse_size("4G")):
+    ...     move_file(["a/b.py"], ["x/y.py"], jobs=8)
+"""
+
+import contextlib
+import os
+import re
+import resource
+import sys
+from typing import Iterator, Optional
+
+UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+# Share of the limit above which concurrency is lowered, and below which it is
+# raised again.
+NEAR_LIMIT = 0.9
+WELL_UNDER_LIMIT = 0.6
+
+# The memory limit in bytes of the current move, or None when unlimited.
+_limit: Optional[int] = None
+
+
+@contextlib.contextmanager
+def limit(max_bytes: Optional[int]) -> Iterator[None]:
+    """Keep the memory used by refac and its workers under `max_bytes` in the block.
+
+    Where memory use cannot be measured (see `rss`), files are still streamed but the
+    number of workers is not adapted to the limit, which is warned about on stderr.
+    """
+    global _limit
+    if max_bytes is not None and rss() == 0:
+        print(
+            "Cannot measure memory use on this platform, so the number of workers "
+            "will not be lowered to stay under the memory limit.",
+            file=sys.stderr,
+        )
+    previous, _limit = _limit, max_bytes
+    try:
+        yield
+    finally:
+        _limit = previous
+
+
+def max_memory() -> Optional[int]:
+    return _limit
+
+
+def is_near_limit(used: int) -> bool:
+    return _limit is not None and used > _limit * NEAR_LIMIT
+
+
+def is_well_under_limit(used: int) -> bool:
+    return _limit is not None and used < _limit * WELL_UNDER_LIMIT
+
+
+def parse_size(text: str) -> int:
+    """Bytes in a size like `512M` or `4G`.
+
+    >>> parse_size("1.5G")
+    1610612736
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)I?B?\s*", text.upper())
+    if match is None:
+        raise ValueError(f"Invalid size {text!r}, expected a size like 512M or 4G.")
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+def format_size(size: int) -> str:
+    return f"{size / (1 << 20):.1f} MB"
+
+
+def rss(pid: Optional[int] = None) -> int:
+    """Bytes of memory currently used by process `pid`, or 0 if unknown.
+
+    Only known on Linux, where it is read from /proc.
+    """
+    try:
+        with open(f"/proc/{pid or os.getpid()}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def peak_rss() -> int:
+    """The most bytes of memory this process has used at once."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
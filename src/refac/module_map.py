@@ -0,0 +1,89 @@
+"""
+In-memory map of the Python modules and packages in the repo.
+
+Answers "is this dotted path a module, a package or a symbol" without probing the
+filesystem. It is built once from the repo's file list and cleared whenever refac
+adds or moves files.
+"""
+
+import functools
+from typing import Iterable, Set
+
+from refac import fs
+from refac.utils import ROOT_DIR, git_ls_files
+
+
+class ModuleMap:
+    """The modules, packages and directories of a set of Python filenames.
+
+    >>> m = ModuleMap(["a/__init__.py", "a/b.py"])
+    >>> m.to_filename("a"), m.to_filename("a.b")
+    ("a/__init__.py", "a/b.py")
+    """
+
+    def __init__(self, filenames: Iterable[str]) -> None:
+        # a/b.py -> a.b
+        self.modules: Set[str] = set()
+        # a/b/__init__.py -> a.b
+        self.packages: Set[str] = set()
+        # Every directory containing a Python file, with or without an __init__.py.
+        self.directories: Set[str] = set()
+
+        for filename in filenames:
+            if not filename.endswith(".py"):
+                continue
+            parts = filename[: -len(".py")].split("/")
+            if parts[-1] == "__init__":
+                self.packages.add(".".join(parts[:-1]))
+            else:
+                self.modules.add(".".join(parts))
+            for i in range(1, len(parts)):
+                self.directories.add(".".join(parts[:i]))
+
+    @classmethod
+    def scan(cls) -> "ModuleMap":
+        """Build the map from the tracked and untracked, non-ignored files in the repo."""
+        deleted = set(git_ls_files("--deleted", "--", "*.py"))
+        filenames = git_ls_files("--cached", "--others", "--exclude-standard", "--", "*.py")
+        filenames = [f for f in filenames if f not in deleted]
+        return cls(fs.list_files(ROOT_DIR, filenames, ".py"))
+
+    def to_filename(self, module: str) -> str:
+        """The filename for `module`, relative to the root of the repo.
+
+        Assumes __init__.py if a directory exists at the module path.
+        """
+        path = module.replace(".", "/")
+        return f"{path}/__init__.py" if module in self.directories else f"{path}.py"
+
+    def exists(self, module: str) -> bool:
+        """True if the file returned by `to_filename` exists."""
+        if module in self.directories:
+            return module in self.packages
+        return module in self.modules
+
+    @staticmethod
+    def to_module(filename: str) -> str:
+        """The module for `filename`, relative to the root of the repo.
+
+        The inverse of `to_filename`. It only depends on the filename, so it works for
+        files that do not exist yet and never needs a scan of the repo.
+
+        >>> ModuleMap.to_module("a/b.py"), ModuleMap.to_module("a/c/__init__.py")
+        ("a.b", "a.c")
+        """
+        parts = filename.split("/")
+        if parts[-1].endswith(".py"):
+            parts[-1] = parts[-1][: -len(".py")]
+        if parts[-1] == "__init__":
+            parts.pop()
+        return ".".join(part for part in parts if part)
+
+
+@functools.lru_cache(maxsize=1)
+def module_map() -> ModuleMap:
+    """The module map of the repo, scanned on first use.
+
+    Call `module_map.cache_clear()` after adding or moving Python files.
+    """
+    return ModuleMap.scan()
@@ -7,76 +7,101 @@ Potential bugs:
 """
 
 import pathlib
-import shutil
-from typing import List
+from typing import List, Sequence
 
-from refac.replace_str import find_and_replace
-
-from refac.utils import ROOT_DIR, make_py_file, shell, to_module
+from refac import codemod, fs, timing
+from refac.module_map import module_map
+from refac.replace_str import find_and_replace_all
+from refac.utils import ROOT_DIR, make_py_file, to_module
 
 
 def validate(old_path: pathlib.Path, new_path: pathlib.Path) -> None:
-    if old_path.is_file() and new_path.is_dir():
+    if fs.is_file(old_path) and fs.is_dir(new_path):
         raise Exception(
             f"Cannot move a file ({old_path}) to a directory ({new_path}). Specify the new filename in directory."
         )
-    elif old_path.is_dir() and new_path.is_file():
+    elif fs.is_dir(old_path) and fs.is_file(new_path):
         raise Exception(f"Cannot move a directory ({old_path}) to a file ({new_path}).")
 
 
+def validate_all(
+    old_paths: Sequence[pathlib.Path], new_paths: Sequence[pathlib.Path]
+) -> None:
+    if len(old_paths) != len(new_paths):
+        raise Exception(
+            f"Must specify the same number of old and new paths. Got {len(old_paths)} and {len(new_paths)}."
+        )
+    resolved = [old_path.resolve() for old_path in old_paths]
+    for old_path in resolved:
+        for other in resolved:
+            if old_path != other and old_path.is_relative_to(other):
+                raise Exception(f"Cannot move both {other} and {old_path}, which is inside it.")
+    if len(set(resolved)) != len(resolved):
+        raise Exception("Cannot move the same path more than once.")
+    for old_path, new_path in zip(old_paths, new_paths):
+        validate(old_path, new_path)
+
+
 def codemod_imports(
-    old_path: pathlib.Path,
-    new_path: pathlib.Path,
+    old_paths: Sequence[pathlib.Path],
+    new_paths: Sequence[pathlib.Path],
+    jobs: int = 1,
 ) -> None:
     """Execute ReplaceImportCodemod to renamed old exports to new exports.
 
-    For performance, we only apply the codemod to Python files may possibly have the old exports.
-    We look for these Python files by absolute import of the `old_module` ('from a.b.c')
-    or relative import of its parts (from .c or from ..b or from ...a).
+    All of the moves are handled in a single pass over the affected files.
+    For performance, we only apply the codemod to Python files that import an `old_module`
+    or one of its submodules, either absolutely ('from a.b.c') or relatively (from .c or
+    from ..b or from ...a). These are looked up in the import index.
     """
-    old_module = to_module(old_path)
-    new_module = to_module(new_path)
-
-    grep_for_filenames_command = f"git grep --files-with-matches --extended-regexp '{old_module.rsplit('.', 1)[1]}' {str(ROOT_DIR)} | grep -E '[.]py$'"
-    codemod_command = f"python3 -m libcst.tool codemod __init__.ReplaceImportCodemod --old={old_module} --new={new_module}"
-    command = f"{grep_for_filenames_command} | xargs {codemod_command}"
-    shell(command)
+    old_modules = [to_module(old_path) for old_path in old_paths]
+    new_modules = [to_module(new_path) for new_path in new_paths]
+    codemod.codemod_imports(old_modules, new_modules, jobs=jobs)
 
 
+@timing.phase("move")
 def move(old_path: pathlib.Path, new_path: pathlib.Path) -> None:
     """Copy contents of `old_path` to `new_path`."""
-    make_py_file(new_path)
+    make_py_file(new_path / "__init__.py" if fs.is_dir(old_path) else new_path)
 
-    if old_path.is_file() and (not new_path.exists() or new_path.is_file()):
-        old_contents = old_path.read_text()
+    if fs.is_file(old_path) and (not fs.exists(new_path) or fs.is_file(new_path)):
+        old_contents = fs.read_text(old_path)
         new_contents = (
-            new_path.read_text() + "\n" if new_path.is_file() else ""
+            fs.read_text(new_path) + "\n" if fs.is_file(new_path) else ""
         ) + old_contents
 
-        new_path.write_text(new_contents)
-        old_path.unlink()
+        fs.write_text(new_path, new_contents)
+        fs.delete(old_path)
         # TODO: May need to remove some imports from the new file if they point to self.
-    elif old_path.is_dir() and (not new_path.exists() or new_path.is_dir()):
-        # May overwrite files in the new directory if they have the same name as files in the old directory.
-        shutil.copytree(old_path, new_path, dirs_exist_ok=True)
-        shutil.rmtree(old_path)
+    elif fs.is_dir(old_path) and (not fs.exists(new_path) or fs.is_dir(new_path)):
+        with timing.step("move tree"):
+            fs.move_tree(old_path, new_path)
+    module_map.cache_clear()
 
 
 def move_file(
-    old_paths: List[str], new_paths: List[str], include_strings: bool = False
+    old_paths: List[str],
+    new_paths: List[str],
+    include_strings: bool = False,
+    jobs: int = 1,
 ) -> None:
-    # TODO: Support moving multiple files?
-    if len(old_paths) != 1 or len(new_paths) != 1:
-        raise Exception("Only support moving one file at a time right now :/")
-    old_path, new_path = pathlib.Path(old_paths[0]), pathlib.Path(new_paths[0])
-    validate(old_path, new_path)
-    move(old_path, new_path)
-    codemod_imports(old_path, new_path)
-
-    if include_strings:
-        old_filename = str(old_path.resolve().relative_to(ROOT_DIR))
-        new_filename = str(new_path.resolve().relative_to(ROOT_DIR))
-        old_module = to_module(old_path)
-        new_module = to_module(new_path)
-        find_and_replace(old_filename, new_filename)
-        find_and_replace(old_module, new_module)
+    """Move files or directories, then update imports for all of them in one pass.
+
+    >>> move_file(["a/b.py", "a/c"], ["x/y.py", "x/z"])
+    """
+    olds = [pathlib.Path(old_path) for old_path in old_paths]
+    news = [pathlib.Path(new_path) for new_path in new_paths]
+    validate_all(olds, news)
+    with fs.transaction():
+        for old_path, new_path in zip(olds, news):
+            move(old_path, new_path)
+        codemod_imports(olds, news, jobs=jobs)
+
+        if include_strings:
+            pairs = []
+            for old_path, new_path in zip(olds, news):
+                old_filename = str(old_path.resolve().relative_to(ROOT_DIR))
+                new_filename = str(new_path.resolve().relative_to(ROOT_DIR))
+                pairs.append((old_filename, new_filename))
+                pairs.append((to_module(old_path), to_module(new_path)))
+            find_and_replace_all(pairs)
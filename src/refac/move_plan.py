@@ -0,0 +1,150 @@
+"""
+Execute many file, symbol and import moves from a single plan file.
+
+Example plan (YAML, or the equivalent JSON):
+
+    - type: file
+      src: a/b.py,a/c
+      dst: x/y.py,x/z
+    - type: symbol
+      src: x.y.Foo
+      dst: x.q.Foo
+    - type: import
+      src: old.lib
+      dst: new.lib
+
+Every physical move is performed first, in order. Then the imports and the strings
+for all of the moves are each updated in one pass over the repo.
+"""
+
+import json
+import pathlib
+from dataclasses import dataclass
+from typing import Any, List, Tuple
+
+from refac import fs
+from refac.codemod import codemod_imports
+from refac.move_file import move as move_path, validate_all as validate_paths
+from refac.move_symbol import move as move_symbols, validate as validate_symbols
+from refac.replace_str import find_and_replace_all
+from refac.utils import ROOT_DIR, to_module
+
+TYPES = ("file", "symbol", "import")
+
+
+@dataclass
+class Move:
+    type: str
+    srcs: List[str]
+    dsts: List[str]
+
+
+def load(path: pathlib.Path) -> List[Move]:
+    """Load a plan from a `.json`, `.yaml` or `.yml` file."""
+    text = path.read_text()
+    if path.suffix in (".yaml", ".yml"):
+        try:
+            import yaml
+        except ImportError:
+            raise Exception(
+                "PyYAML is required to read YAML plans. Install it with `pip install refac[yaml]`."
+            )
+        data: Any = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+
+    if not isinstance(data, list):
+        raise Exception(f"Expected the plan to be a list of moves. Got: {type(data)}")
+
+    moves: List[Move] = []
+    for i, entry in enumerate(data):
+        if not isinstance(entry, dict) or entry.get("type") not in TYPES:
+            raise Exception(
+                f"Move #{i} must be a mapping with a `type` of {', '.join(TYPES)}. Got: {entry!r}"
+            )
+        srcs, dsts = split(entry.get("src")), split(entry.get("dst"))
+        if not srcs or len(srcs) != len(dsts):
+            raise Exception(
+                f"Move #{i} must have the same number of `src` and `dst`. Got: {entry!r}"
+            )
+        moves.append(Move(entry["type"], srcs, dsts))
+    return moves
+
+
+def split(value: Any) -> List[str]:
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",")]
+    if isinstance(value, list):
+        return [str(v).strip() for v in value]
+    return []
+
+
+def compose(pairs: List[Tuple[str, str]], sep: str = ".") -> List[Tuple[str, str]]:
+    """Combine sequential renames into renames that can all be applied at once.
+
+    A later rename of something an earlier rename produced is folded into it, and
+    more specific renames are ordered first so they take precedence.
+
+    >>> compose([("a.b", "x.y"), ("x.y.Foo", "z.Foo")])
+    [("a.b.Foo", "z.Foo"), ("x.y.Foo", "z.Foo"), ("a.b", "x.y")]
+    >>> compose([("a.b.Foo", "x.y.Foo"), ("x.y", "q.r")])
+    [("a.b.Foo", "q.r.Foo"), ("x.y", "q.r")]
+    """
+    composed: List[Tuple[str, str]] = []
+    for old, new in pairs:
+        derived: List[Tuple[str, str]] = []
+        for i, (earlier_old, earlier_new) in enumerate(composed):
+            if earlier_new == old:
+                composed[i] = (earlier_old, new)
+            elif earlier_new.startswith(old + sep):
+                composed[i] = (earlier_old, new + earlier_new[len(old) :])
+            elif old.startswith(earlier_new + sep):
+                derived.append((earlier_old + old[len(earlier_new) :], new))
+        composed.extend(derived)
+        composed.append((old, new))
+
+    seen = set()
+    unique = []
+    for old, new in composed:
+        if old != new and old not in seen:
+            seen.add(old)
+            unique.append((old, new))
+    return sorted(unique, key=lambda pair: pair[0].count(sep), reverse=True)
+
+
+def move_plan(plan_path: str, jobs: int = 1) -> None:
+    moves = load(pathlib.Path(plan_path))
+
+    with fs.transaction():
+        apply(moves, jobs)
+
+
+def apply(moves: List[Move], jobs: int) -> None:
+    import_pairs: List[Tuple[str, str]] = []
+    filename_pairs: List[Tuple[str, str]] = []
+    string_pairs: List[Tuple[str, str]] = []
+    for m in moves:
+        if m.type == "file":
+            olds = [pathlib.Path(src) for src in m.srcs]
+            news = [pathlib.Path(dst) for dst in m.dsts]
+            validate_paths(olds, news)
+            for old_path, new_path in zip(olds, news):
+                old_module, new_module = to_module(old_path), to_module(new_path)
+                old_filename = str(old_path.resolve().relative_to(ROOT_DIR))
+                new_filename = str(new_path.resolve().relative_to(ROOT_DIR))
+                move_path(old_path, new_path)
+                import_pairs.append((old_module, new_module))
+                filename_pairs.append((old_filename, new_filename))
+                string_pairs.append((old_module, new_module))
+        elif m.type == "symbol":
+            validate_symbols(m.srcs, m.dsts)
+            moved = move_symbols(m.srcs, m.dsts)
+            import_pairs.extend(moved)
+            string_pairs.extend(moved)
+        elif m.type == "import":
+            import_pairs.extend(zip(m.srcs, m.dsts))
+
+    pairs = compose(import_pairs)
+    codemod_imports([old for old, _ in pairs], [new for _, new in pairs], jobs=jobs)
+
+    find_and_replace_all(compose(filename_pairs, sep="/") + compose(string_pairs))
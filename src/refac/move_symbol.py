@@ -2,16 +2,17 @@
 Move Python symbol and fix all imports.
 """
 
-from typing import List
-from libcst import parse_module
+from typing import List, Tuple
 
-from libcst.codemod.visitors import ImportItem
+from libcst.codemod.visitors import AddImportsVisitor
 from libcst.codemod._context import CodemodContext
 from libcst.metadata.full_repo_manager import FullRepoManager
 from libcst.metadata.name_provider import FullyQualifiedNameProvider
 
-from refac.replace_str import find_and_replace
-from refac.utils import ROOT_DIR, shell, to_file
+from refac import fs, timing
+from refac.codemod import codemod_imports, parse
+from refac.replace_str import find_and_replace_all
+from refac.utils import ROOT_DIR, to_file
 from refac.visitors.add_symbols import AddSymbolsVisitor
 from refac.visitors.remove_symbols import RemoveSymbolsVisitor
 
@@ -40,7 +41,17 @@ def validate(old_full_symbols: List[str], new_full_symbols: List[str]) -> None:
     )
 
 
-def move(srcs: List[str], dsts: List[str]) -> None:
+@timing.phase("move")
+def move(srcs: List[str], dsts: List[str]) -> List[Tuple[str, str]]:
+    """Move the symbols from the old module to the new one, parsing and writing each once.
+
+    The old module loses the symbols and imports them back from the new module in a
+    single transform. Only the old module needs metadata; the new module is parsed
+    without any.
+
+    Symbols of the old module that only the moved symbols use move along with them.
+    Returns the old and new full names of all moved symbols.
+    """
     old_module = srcs[0].rsplit(".", 1)[0]
     old_symbols = {src.rsplit(".", 1)[1] for src in srcs}
     new_module = dsts[0].rsplit(".", 1)[0]
@@ -48,70 +59,52 @@ def move(srcs: List[str], dsts: List[str]) -> None:
     old_file = to_file(old_module, should_already_exist=True)
     new_file = to_file(new_module, should_create=True)
 
-    manager = FullRepoManager(
-        str(ROOT_DIR), [str(old_file), str(new_file)], [FullyQualifiedNameProvider]
-    )
-    old_wrapper = manager.get_metadata_wrapper_for_path(str(old_file))
-    new_wrapper = manager.get_metadata_wrapper_for_path(str(new_file))
+    # Read through `fs` rather than `manager.get_metadata_wrapper_for_path` so that a dry
+    # run sees files it created or changed.
+    with timing.step("parse"):
+        old_code, old_encoding = fs.decode(fs.read_bytes(old_file))
+        new_code, new_encoding = fs.decode(fs.read_bytes(new_file))
+        old_tree = parse(old_code)
+        new_tree = parse(new_code)
 
     old_context = CodemodContext(
         filename=str(old_file),
         full_module_name=old_module,
-        wrapper=old_wrapper,
-        metadata_manager=manager,
+        metadata_manager=FullRepoManager(
+            str(ROOT_DIR), [str(old_file)], [FullyQualifiedNameProvider]
+        ),
     )
-    new_context = CodemodContext(
-        filename=str(new_file),
-        full_module_name=new_module,
-        wrapper=new_wrapper,
-        metadata_manager=manager,
-    )
-
-    remove_visitor = RemoveSymbolsVisitor(old_context, old_symbols)
-    assert old_context.module, "Module must be defined"
-    updated_old_tree = remove_visitor.transform_module(old_context.module)
-    old_file.write_text(updated_old_tree.code)
+    remove_visitor = RemoveSymbolsVisitor(old_context, old_symbols, move_dependencies=True)
+    # Add back any symbols that are still needed in old module. This runs after the
+    # removal, in the same `transform_module`.
+    for symbol in sorted(old_symbols):
+        AddImportsVisitor.add_needed_import(old_context, new_module, symbol)
+    with timing.step("RemoveSymbolsVisitor"):
+        updated_old_tree = remove_visitor.transform_module(old_tree)
+    fs.write_text(old_file, updated_old_tree.code, old_encoding)
 
     removed = remove_visitor.context.scratch[RemoveSymbolsVisitor.CONTEXT_KEY]
     nodes_to_add = removed["nodes"]
     imports_to_add = removed["imports"]
+    dependencies = sorted(removed["dependencies"])
+    if dependencies:
+        print(f"Also moving {', '.join(dependencies)}, only used by the moved symbols.")
 
+    new_context = CodemodContext(filename=str(new_file), full_module_name=new_module)
     add_visitor = AddSymbolsVisitor(new_context, nodes_to_add, imports_to_add)
-    assert new_context.module, "Module must be defined"
-    updated_new_tree = add_visitor.transform_module(new_context.module)
-    new_file.write_text(updated_new_tree.code)
-
-    # Add back any symbols that are still needed in old module.
-    add_visitor_for_old_file = AddSymbolsVisitor(
-        old_context,
-        set(),
-        {ImportItem(new_module, symbol) for symbol in old_symbols},
-    )
-    updated_old_tree_again = add_visitor_for_old_file.transform_module(
-        parse_module(updated_old_tree.code)
-    )
-    old_file.write_text(updated_old_tree_again.code)
-
-
-def codemod_imports(old_symbols: List[str], new_symbols: List[str]) -> None:
-    """Execute ReplaceImportCodemod to renamed old exports to new exports.
-
-    For performance, we only apply the codemod to Python files that contain any of the old symbols
-    """
-
-    symbols = [old_symbol.rsplit(".", 1)[1] for old_symbol in old_symbols]
-    combined = "(" + "|".join(symbols) + ")"
+    with timing.step("AddSymbolsVisitor"):
+        updated_new_tree = add_visitor.transform_module(new_tree)
+    fs.write_text(new_file, updated_new_tree.code, new_encoding)
 
-    grep_for_filenames_command = f"git grep --files-with-matches --extended-regexp '{combined}' {str(ROOT_DIR)} | grep -E '[.]py$'"
-    codemod_command = f"python3 -m libcst.tool codemod __init__.ReplaceImportCodemod --old={','.join(old_symbols)} --new={','.join(new_symbols)}"
-    command = f"{grep_for_filenames_command} | xargs {codemod_command}"
-    shell(command)
+    return list(zip(srcs, dsts)) + [
+        (f"{old_module}.{name}", f"{new_module}.{name}") for name in dependencies
+    ]
 
 
-def move_symbol(srcs: List[str], dsts: List[str]) -> None:
+def move_symbol(srcs: List[str], dsts: List[str], jobs: int = 1) -> None:
     validate(srcs, dsts)
-    move(srcs, dsts)
-    codemod_imports(srcs, dsts)
+    with fs.transaction():
+        pairs = move(srcs, dsts)
+        codemod_imports([old for old, _ in pairs], [new for _, new in pairs], jobs=jobs)
 
-    for src, dst in zip(srcs, dsts):
-        find_and_replace(src, dst)
+        find_and_replace_all(pairs)
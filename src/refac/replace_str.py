@@ -1,33 +1,103 @@
 import re
-import subprocess
-import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
 
-from refac.utils import shell
+from refac import fs, timing
+from refac.utils import ROOT_DIR, git_ls_files
 
 
-def escape(s: str) -> str:
-    """Escape a string for use in sed.
+def trie_regex(words: Sequence[str]) -> str:
+    """Build a regex matching any of `words`, with common prefixes factored out.
 
-    In addition to usual regex escaping, we also need to escape forward slashes (/).
-    >>> escape("foo/bar.py")
-    "foo\\/bar\\.py"
+    Factoring the prefixes keeps matching fast with thousands of words, and the
+    greedy optional groups make the longest word win when several match.
+
+    >>> trie_regex(["ab", "abc", "ad"])
+    "a(?:b(?:c)?|d)"
     """
-    return re.escape(s).replace("/", "\\/")
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
 
+    def build(node: Dict[str, dict]) -> str:
+        alternatives = [
+            re.escape(char) + build(child) for char, child in sorted(node.items()) if char
+        ]
+        if not alternatives:
+            return ""
+        body = (
+            alternatives[0]
+            if len(alternatives) == 1
+            else "(?:" + "|".join(alternatives) + ")"
+        )
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+def replace_in_file(
+    filename: str, pattern: "re.Pattern[bytes]", replacements: Dict[bytes, bytes]
+) -> Optional[str]:
+    """Apply `replacements` to `filename`, writing it only if it changed.
+
+    Returns the filename if it was changed. Binary files are skipped, like `git grep`.
+    """
+    path = ROOT_DIR / filename
+    try:
+        old = fs.read_bytes(path)
+    except OSError:
+        return None
+    if b"\0" in old or not pattern.search(old):
+        return None
+    new = pattern.sub(lambda m: replacements[m.group(0)], old)
+    if new == old:
+        return None
+    fs.write_bytes(path, new)
+    return filename
 
-def find_and_replace(old: str, new: str) -> subprocess.CompletedProcess:
-    """Find and replace a string in all files in the repo.
 
-    Relies on `git grep` and `sed` commands.
+@timing.phase("strings")
+def find_and_replace_all(pairs: Sequence[Tuple[str, str]]) -> List[str]:
+    """Find and replace several strings in all files in the repo, in a single pass.
+
+    Each file is scanned once for all of the `old` strings at the same time. Where
+    several `old` strings match at the same position, the longest one is replaced.
+    Returns the files that were changed.
+
+    >>> find_and_replace_all([("a/b.py", "x/y.py"), ("a.b", "x.y")])
+    ["src/docs.md"]
+    """
+    replacements: Dict[bytes, bytes] = {}
+    for old, new in pairs:
+        if old and old != new:
+            replacements.setdefault(old.encode(), new.encode())
+    if not replacements:
+        return []
+
+    pattern = re.compile(trie_regex([old.decode() for old in replacements]).encode())
+    with timing.step("list files"):
+        filenames = fs.list_files(
+            ROOT_DIR, git_ls_files("--cached", "--others", "--exclude-standard")
+        )
+    with ThreadPoolExecutor() as executor:
+        changed = [
+            filename
+            for filename in executor.map(
+                lambda filename: replace_in_file(filename, pattern, replacements),
+                sorted(set(filenames)),
+            )
+            if filename is not None
+        ]
+    print(f"Replaced strings in {len(changed)} files.\n")
+    return changed
+
+
+def find_and_replace(old: str, new: str) -> List[str]:
+    """Find and replace a string in all files in the repo.
 
     >>> find_and_replace("old", "new")
     """
-    bsd_sed = "sed -i '' -e"
-    gnu_sed = "sed -i"
-    sed = bsd_sed if sys.platform == "darwin" else gnu_sed
-
-    bsd_xargs = "xargs"
-    gnu_xargs = "xargs --no-run-if-empty"
-    xargs = bsd_xargs if sys.platform == "darwin" else gnu_xargs
-    command = f"git grep --files-with-matches --fixed-strings '{old}' | {xargs} {sed} 's/{escape(old)}/{escape(new)}/g'"
-    return shell(command)
+    return find_and_replace_all([(old, new)])
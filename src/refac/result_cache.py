@@ -0,0 +1,146 @@
+"""
+On-disk cache of ReplaceImportCodemod results.
+
+Re-running an identical move (e.g. after it failed halfway, or after a rebase) skips
+parsing every file whose content hasn't changed since the last run.
+"""
+
+import hashlib
+import json
+import os
+import pathlib
+from typing import Optional, Sequence, Tuple
+
+from refac import __version__
+from refac.utils import CACHE_DIR
+
+UNCHANGED = b"="
+CHANGED = b"+"
+
+# Share of `max_bytes` that pruning evicts down to, so that the next runs can add
+# entries for a while before the cache has to be scanned again.
+PRUNED_SHARE = 0.8
+
+
+def pairs_key(olds: Sequence[str], news: Sequence[str]) -> str:
+    """Normalize the renames, dropping whitespace and renames that are no-ops."""
+    pairs = [
+        (old.strip(), new.strip())
+        for old, new in zip(olds, news)
+        if old.strip() != new.strip()
+    ]
+    return json.dumps(pairs, separators=(",", ":"))
+
+
+class ResultCache:
+    """Maps (refac version, renames, module, package, file content) to the codemod output.
+
+    The package is part of the key since relative imports depend on it: `a/b.py` and
+    `a/b/__init__.py` are both module `a.b`, but in packages `a` and `a.b`.
+
+    Entries are stored one per file and evicted least recently used first once the
+    space they take on disk grows past `max_bytes`. That space is kept up to date in
+    the `size` file, so the entries are only scanned when some must be evicted.
+    """
+
+    def __init__(
+        self, path: Optional[pathlib.Path] = None, max_bytes: int = 256 * 1024 * 1024
+    ) -> None:
+        self.path = path or CACHE_DIR / "results"
+        self.max_bytes = max_bytes
+        self.size_path = self.path / "size"
+
+    def key(
+        self, pairs: str, full_module_name: str, full_package_name: str, code: str
+    ) -> str:
+        digest = hashlib.sha256()
+        for part in (__version__, pairs, full_module_name, full_package_name, code):
+            digest.update(part.encode("utf-8", "surrogateescape"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def entry(self, key: str) -> pathlib.Path:
+        return self.path / key[:2] / key
+
+    def get(self, key: str) -> Optional[Tuple[bool, Optional[str]]]:
+        """Return `(changed, new_code)` for a cached result, or None on a miss."""
+        entry = self.entry(key)
+        try:
+            data = entry.read_bytes()
+            os.utime(entry)
+        except OSError:
+            return None
+        if data[:1] == UNCHANGED:
+            return (False, None)
+        if data[:1] == CHANGED:
+            return (True, data[1:].decode("utf-8", "surrogateescape"))
+        return None
+
+    def set(self, key: str, changed: bool, code: Optional[str]) -> int:
+        """Cache a result, returning the bytes its entry takes on disk (see `prune`)."""
+        entry = self.entry(key)
+        data = (
+            CHANGED + (code or "").encode("utf-8", "surrogateescape")
+            if changed
+            else UNCHANGED
+        )
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, entry)
+            return disk_usage(entry.stat())
+        except OSError:
+            return 0
+
+    def prune(self, added: int) -> int:
+        """Count `added` more bytes from `set`, and evict entries if over `max_bytes`.
+
+        Least recently used entries are evicted first, until the cache takes at most
+        `PRUNED_SHARE` of `max_bytes`. Returns the number of evicted entries.
+        """
+        try:
+            size: Optional[int] = int(self.size_path.read_text()) + added
+        except (OSError, ValueError):
+            size = None
+        if size is not None and size <= self.max_bytes:
+            self.save_size(size)
+            return 0
+
+        entries = []
+        total = 0
+        for entry in self.path.glob("*/*"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, disk_usage(stat), entry))
+            total += disk_usage(stat)
+
+        evicted = 0
+        if total > self.max_bytes:
+            for _, usage, entry in sorted(entries):
+                if total <= self.max_bytes * PRUNED_SHARE:
+                    break
+                try:
+                    entry.unlink()
+                except OSError:
+                    continue
+                total -= usage
+                evicted += 1
+        self.save_size(total)
+        return evicted
+
+    def save_size(self, size: int) -> None:
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            tmp = self.size_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(str(size))
+            os.replace(tmp, self.size_path)
+        except OSError:
+            pass
+
+
+def disk_usage(stat: os.stat_result) -> int:
+    """Bytes that a file takes on disk: whole blocks, even for a 1 byte entry."""
+    return max(getattr(stat, "st_blocks", 0) * 512, stat.st_size)
@@ -0,0 +1,193 @@
+"""
+Wall time spent in each phase of a move, and on each file that was codemodded, and
+the peak memory of each process.
+
+Phases are only timed inside `recording()`, so they cost nothing in normal runs.
+
+    >>> with recording() as profile:
+    ...     move_file(["a/b.py"], ["x/y.py"])
+    >>> profile.phases
+    {"move": 0.01, "find": 0.2, "codemod": 1.5, "strings": 0.3, "commit": 0.05}
+    >>> profile.slowest_files(1)
+    [("a/c.py", {"read": 0.0, "parse": 0.1, "metadata": 0.3, "transform": 0.1, ...})]
+
+The same recording can be exported as Chrome trace events with `to_trace`, to see
+every phase and every file on a timeline per process in Perfetto or
+chrome://tracing. Times are taken from `time.perf_counter`, which is the same
+monotonic clock in every process on Linux and macOS.
+"""
+
+import contextlib
+import os
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from refac import memory
+
+# A named step and its start and end time.
+Span = Tuple[str, float, float]
+
+
+class Profile:
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        # Seconds spent in each phase of the move.
+        self.phases: Dict[str, float] = {}
+        # Seconds spent in each step of codemodding a file, by filename.
+        self.files: Dict[str, Dict[str, float]] = {}
+        # Most bytes of memory used at once, by process id.
+        self.memory: Dict[int, int] = {}
+        # Chrome trace events for the phases, steps and files.
+        self.events: List[Dict[str, Any]] = []
+
+    def add_event(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        category: str,
+        pid: Optional[int] = None,
+        tid: Optional[int] = None,
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        pid = os.getpid() if pid is None else pid
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": (start - self.start) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": pid,
+            "tid": threading.get_native_id() if tid is None else tid,
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def slowest_files(self, n: int) -> List[Tuple[str, Dict[str, float]]]:
+        return sorted(
+            self.files.items(), key=lambda item: sum(item[1].values()), reverse=True
+        )[:n]
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"phases": self.phases, "files": self.files, "memory": self.memory}
+
+    def to_trace(self) -> Dict[str, Any]:
+        """The events in the Chrome trace event format, with names for the processes."""
+        main = os.getpid()
+        names = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": pid,
+                "args": {"name": "refac" if pid == main else f"refac worker {pid}"},
+            }
+            for pid in sorted({event["pid"] for event in self.events} | {main})
+        ]
+        return {"traceEvents": names + self.events, "displayTimeUnit": "ms"}
+
+    def report(self, top: int) -> str:
+        """A summary of the phases and the `top` slowest files."""
+        lines = ["Time per phase:"]
+        lines += [f"  {name:<10} {seconds:8.3f}s" for name, seconds in self.phases.items()]
+        slowest = self.slowest_files(top)
+        if slowest:
+            lines.append(f"Slowest {len(slowest)} of {len(self.files)} codemodded files:")
+        for filename, steps in slowest:
+            detail = ", ".join(f"{step} {seconds:.3f}s" for step, seconds in steps.items())
+            lines.append(f"  {sum(steps.values()):8.3f}s  {filename}  ({detail})")
+        if self.memory:
+            lines.append("Peak memory per process:")
+        main = os.getpid()
+        for pid, size in sorted(self.memory.items(), key=lambda item: item[0] != main):
+            name = "refac" if pid == main else f"worker {pid}"
+            lines.append(f"  {name:<14} {memory.format_size(size):>10}")
+        return "\n".join(lines) + "\n"
+
+
+# The profile of the current recording, or None when not recording.
+_profile: Optional[Profile] = None
+
+
+@contextlib.contextmanager
+def recording() -> Iterator[Profile]:
+    """Collect the duration of every phase and file until the end of the block."""
+    global _profile
+    previous, _profile = _profile, Profile()
+    try:
+        yield _profile
+    finally:
+        _profile = previous
+
+
+@contextlib.contextmanager
+def span(spans: List[Span], name: str) -> Iterator[None]:
+    """Append the start and end time of the block to `spans`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans.append((name, start, time.perf_counter()))
+
+
+def durations(spans: List[Span]) -> Dict[str, float]:
+    """Total seconds per name in `spans`."""
+    result: Dict[str, float] = {}
+    for name, start, end in spans:
+        result[name] = result.get(name, 0.0) + end - start
+    return result
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Add the wall time of the block to phase `name`, if recording.
+
+    Also works as a decorator, timing every call of the function.
+    """
+    profile = _profile
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        profile.phases[name] = profile.phases.get(name, 0.0) + end - start
+        profile.add_event(name, start, end, "phase")
+
+
+@contextlib.contextmanager
+def step(name: str) -> Iterator[None]:
+    """Trace the block as a step of the current phase, if recording.
+
+    Unlike phases, steps are not listed in the `report`.
+    """
+    profile = _profile
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_event(name, start, time.perf_counter(), "step")
+
+
+def add_file(filename: str, spans: List[Span], pid: int) -> None:
+    """Record the steps of codemodding `filename` in process `pid`, if recording."""
+    if _profile is None or not spans:
+        return
+    _profile.files[filename] = durations(spans)
+    start = min(start for _, start, _ in spans)
+    end = max(end for _, _, end in spans)
+    _profile.add_event(filename, start, end, "file", pid=pid, tid=pid)
+    for name, start, end in spans:
+        _profile.add_event(name, start, end, "step", pid=pid, tid=pid, args={"file": filename})
+
+
+def add_memory(pid: int, max_rss: int) -> None:
+    """Record that process `pid` used up to `max_rss` bytes of memory, if recording."""
+    if _profile is not None:
+        _profile.memory[pid] = max(_profile.memory.get(pid, 0), max_rss)
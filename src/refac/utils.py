@@ -1,10 +1,23 @@
+import hashlib
 import os
 import pathlib
 import subprocess
 import sys
+from typing import List
+
+from refac import fs
 
 
 ROOT_DIR = pathlib.Path(os.environ.get("ROOT_DIR", os.getcwd()))
+CACHE_DIR = pathlib.Path(
+    os.environ.get(
+        "REFAC_CACHE_DIR",
+        pathlib.Path.home()
+        / ".cache"
+        / "refac"
+        / hashlib.sha1(str(ROOT_DIR.resolve()).encode()).hexdigest()[:16],
+    )
+)
 
 
 def shell(command: str, **kwargs) -> subprocess.CompletedProcess:
@@ -24,6 +37,22 @@ def shell(command: str, **kwargs) -> subprocess.CompletedProcess:
     )
 
 
+def git_ls_files(*args: str) -> List[str]:
+    """Run `git ls-files` in $ROOT_DIR and return the listed filenames.
+
+    >>> git_ls_files("--others", "--exclude-standard", "--", "*.py")
+    ["src/new_file.py"]
+    """
+    result = subprocess.run(
+        ["git", "ls-files", "-z", *args],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return [line for line in result.stdout.split("\0") if line]
+
+
 def to_module(path: pathlib.Path) -> str:
     """Convert a Python filename to a Python module name.
 
@@ -35,8 +64,11 @@ def to_module(path: pathlib.Path) -> str:
     >>> _to_module(tests/unit/lib/__init__.py)
     tests.unit.lib
     """
-    filename = path.resolve().relative_to(ROOT_DIR)
-    return str(filename).replace(".py", "").replace("__init__", "").replace("/", ".")
+    from refac.module_map import ModuleMap
+
+    # `resolve()` only makes `path` relative to $ROOT_DIR, like `fs.key`. The module
+    # name itself comes from the filename, without looking at the repo.
+    return ModuleMap.to_module(path.resolve().relative_to(ROOT_DIR).as_posix())
 
 
 def to_file(
@@ -44,23 +76,20 @@ def to_file(
 ) -> pathlib.Path:
     """Convert a Python module to a Python filename.
 
-    Assumes __init__.py if a directory exists at the module path.
+    Assumes __init__.py if a directory exists at the module path. Looks the module
+    up in the repo's module map instead of probing the filesystem.
 
     >>> to_file("src.models.user")
     pathlib.Path("src/models/user.py")
     >>> to_file("src.models")
     pathlib.Path("src/models/__init__.py")
     """
-    dirname = module.replace(".", "/")
-    filename = module.replace(".", "/") + ".py"
-    alternate = module.replace(".", "/") + "/__init__.py"
+    from refac.module_map import module_map
 
-    if pathlib.Path(dirname).is_dir():
-        path = pathlib.Path(alternate)
-    else:
-        path = pathlib.Path(filename)
+    modules = module_map()
+    path = ROOT_DIR / modules.to_filename(module)
 
-    if should_already_exist and not path.exists():
+    if should_already_exist and not modules.exists(module):
         raise FileNotFoundError(f"File {path} does not exist.")
     if should_create:
         make_py_file(path)
@@ -74,13 +103,16 @@ def make_py_file(path: pathlib.Path) -> None:
 
     >>> make_py_file(pathlib.Path("src/models/user.py"))
     """
-    if path.exists():
+    if fs.exists(path):
         return
     parent = path.parent.resolve()
-    parent.mkdir(parents=True, exist_ok=True)
-    path.touch()
+    fs.write_bytes(path, b"")
 
     while parent != ROOT_DIR:
-        if not (parent / "__init__.py").exists():
-            (parent / "__init__.py").touch()
+        if not fs.exists(parent / "__init__.py"):
+            fs.write_bytes(parent / "__init__.py", b"")
         parent = parent.parent
+
+    from refac.module_map import module_map
+
+    module_map.cache_clear()
@@ -1,4 +1,4 @@
-from typing import List, Union
+from typing import Iterable, List, Union
 
 import libcst as cst
 from libcst.codemod import (
@@ -17,7 +17,7 @@ class AddSymbolsVisitor(VisitorBasedCodemodCommand):
     def __init__(
         self,
         context: CodemodContext,
-        nodes_to_add: set[Union[Imports, Definitions]],
+        nodes_to_add: Iterable[Union[Imports, Definitions]],
         imports_to_add: set[ImportItem],
     ) -> None:
         super().__init__(context)
@@ -1,56 +1,80 @@
-from dataclasses import dataclass
-from typing import Any, cast, List, Literal, Optional, Sequence, Union
+import ast
+import functools
+import sys
+from typing import Any, cast, Dict, List, Literal, Optional, Sequence, Tuple, Union
 
 import libcst as cst
 from libcst.codemod import CodemodContext
-from libcst.helpers import get_absolute_module_for_import_or_raise
+from libcst.helpers import get_absolute_module, get_absolute_module_for_import_or_raise
 
-from refac.utils import to_file
 
 
-@dataclass(frozen=True)
 class Import:
     """Represents a single import.
 
     The import statement `from a.b import c,d` refers to two imports: a.b.c, a.b.d
 
+    Imports are equal if they are written the same way, so `from a import b` and
+    `import a.b` are different imports with the same `name`. `name`, `parts` and
+    `key` are computed once since they are needed for every usage in a module, and
+    imports are immutable so that they stay in sync with them and with the hash.
+
     TODO: Consider replaceing with libcst.visitors.ImportItem
     """
 
+    __slots__ = ("module", "obj", "asname", "name", "parts", "key", "_hash")
+
     module: str
-    obj: Optional[str] = None
-    asname: Optional[str] = None
+    obj: Optional[str]
+    asname: Optional[str]
+    name: str
+    parts: Tuple[str, ...]
+    # Part of the import used when referencing the import in code.
+    #
+    # from a import b      -> b
+    # from a import b as c -> c
+    # import a.b           -> a.b
+    key: str
+
+    def __init__(
+        self, module: str, obj: Optional[str] = None, asname: Optional[str] = None
+    ) -> None:
+        name = sys.intern(f"{module}.{obj}" if obj else module)
+        for attr, value in (
+            ("module", module),
+            ("obj", obj),
+            ("asname", asname),
+            ("name", name),
+            ("parts", tuple(sys.intern(part) for part in name.split("."))),
+            ("key", sys.intern(asname or obj or module)),
+            ("_hash", hash((name, obj, asname))),
+        ):
+            object.__setattr__(self, attr, value)
+
+    def __setattr__(self, attr: str, value: Any) -> None:
+        raise AttributeError(f"Cannot set {attr!r}, Import is immutable.")
+
+    def __delattr__(self, attr: str) -> None:
+        raise AttributeError(f"Cannot delete {attr!r}, Import is immutable.")
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # The default for slots sets each attribute, so copy and pickle by arguments.
+        return (Import, (self.module, self.obj, self.asname))
 
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, Import):
             return False
-        return self.name == other.name
-
-    @property
-    def parts(self) -> List[str]:
-        parts = self.module.split(".")
-        if self.obj:
-            parts += [self.obj]
-        return parts
-
-    @property
-    def name(self) -> str:
-        return ".".join(self.parts)
+        return (
+            self.name == other.name
+            and self.obj == other.obj
+            and self.asname == other.asname
+        )
 
-    @property
-    def key(self) -> str:
-        """Part of the import used when referencing the import in code.
+    def __hash__(self) -> int:
+        return self._hash
 
-        from a import b      -> b
-        from a import b as c -> c
-        import a.b           -> a.b
-        """
-        if self.asname:
-            return self.asname
-        elif self.obj:
-            return self.obj
-        else:
-            return self.module
+    def __repr__(self) -> str:
+        return f"Import(module={self.module!r}, obj={self.obj!r}, asname={self.asname!r})"
 
     @property
     def origin(self) -> Literal["Import", "ImportFrom"]:
@@ -116,16 +140,13 @@ class Import:
     def to_libcst_node(
         self, context: CodemodContext
     ) -> Union[cst.Import, cst.ImportFrom]:
-        def parse(s: str) -> cst.Name:
-            return cast(cst.Name, cst.parse_expression(s, config=context.module.config_for_parsing))  # type: ignore[union-attr]
-
         if self.obj:
             return cst.ImportFrom(
-                module=parse(self.module),
+                module=dotted_name_node(self.module),
                 names=[
                     cst.ImportAlias(
-                        name=parse(self.obj),
-                        asname=cst.AsName(name=parse(self.asname))
+                        name=cst.Name(self.obj),
+                        asname=cst.AsName(name=cst.Name(self.asname))
                         if self.asname
                         else None,
                     )
@@ -135,47 +156,91 @@ class Import:
             return cst.Import(
                 names=[
                     cst.ImportAlias(
-                        name=parse(self.module),
-                        asname=cst.AsName(name=parse(self.asname))
+                        name=dotted_name_node(self.module),
+                        asname=cst.AsName(name=cst.Name(self.asname))
                         if self.asname
                         else None,
                     )
                 ]
             )
 
-    @property
-    def is_symbol(self) -> bool:
-        """True if the last part of the import refers to a symbol, not a module.
 
-        >>> Import('foo.bar.baz').is_symbol
-        True
-        >>> Import('foo.bar').is_symbol
-        False
-        """
-        if self.name.count(".") == 0:
+@functools.lru_cache(maxsize=4096)
+def dotted_name_node(name: str) -> Union[cst.Name, cst.Attribute]:
+    """Build the expression for a dotted name without running the parser.
+
+    Nodes are immutable, so the same node is returned for the same name.
+
+    >>> dotted_name_node("a.b")
+    Attribute(value=Name(value="a"), attr=Name(value="b"))
+    """
+    head, *rest = name.split(".")
+    node: Union[cst.Name, cst.Attribute] = cst.Name(head)
+    for part in rest:
+        node = cst.Attribute(value=node, attr=cst.Name(part))
+    return node
+
+
+class ImportCollector(cst.CSTVisitor):
+    """Collect every `cst.Import` and `cst.ImportFrom` in a module.
+
+    Expressions are never visited since they cannot contain import statements.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.imports: List[Union[cst.Import, cst.ImportFrom]] = []
+
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        if isinstance(node, (cst.Import, cst.ImportFrom)):
+            self.imports.append(node)
             return False
+        return not isinstance(node, cst.BaseExpression)
 
-        [head, last] = self.name.rsplit(".", 1)
-        f = to_file(head, should_already_exist=False)
-        return f.is_file() or (
-            (f / "__init__.py").is_file() and not (f / f"{last}.py").is_file()
-        )
 
-    @property
-    def requires_exact_match(self) -> bool:
-        """True if this import is a symbol.
+class ImportTable:
+    """The imports of a module, computed once per file and shared between visitors.
 
-        Symbols require exact matches because we're just trying to rename a specific object.
-        Modules do not require exact matches because we're trying to renamed a bunch of objects with a shared prefix.
+    Maps each import node to its `Import`s, and the first part of each `Import.key`
+    to the `Import`s that bind it.
 
-        Examples:
-            Symbol #1: a.b.c
-            Symbol #2: a.b.cd
+    >>> table = ImportTable.build(context, cst.parse_module("from a import b as c"))
+    >>> table.by_key
+    {"c": [Import("a", "b", "c")]}
+    """
 
-            If we try and rename a.b.c, we don't accidentally want to move a.b.cd
-            If we try and rename a.b, we want to move both a.b.c and a.b.cd
-        """
-        return self.is_symbol
+    CONTEXT_KEY = "ImportTable"
+
+    def __init__(self, context: CodemodContext) -> None:
+        self.context = context
+        self.by_node: Dict[cst.CSTNode, List[Import]] = {}
+        self.by_key: Dict[str, List[Import]] = {}
+
+    @classmethod
+    def build(cls, context: CodemodContext, module: cst.Module) -> "ImportTable":
+        """Build the table for `module` and share it on the context."""
+        table = cls(context)
+        collector = ImportCollector()
+        module.visit(collector)
+        for node in collector.imports:
+            for im in table.imports(node):
+                table.by_key.setdefault(im.key.split(".", 1)[0], []).append(im)
+        context.scratch[cls.CONTEXT_KEY] = table
+        return table
+
+    @classmethod
+    def get(cls, context: CodemodContext) -> "ImportTable":
+        """The table shared on the context, or an empty one filled in on demand."""
+        table = context.scratch.get(cls.CONTEXT_KEY)
+        if table is None:
+            table = context.scratch[cls.CONTEXT_KEY] = cls(context)
+        return table
+
+    def imports(self, node: Union[cst.Import, cst.ImportFrom]) -> List[Import]:
+        imports = self.by_node.get(node)
+        if imports is None:
+            imports = self.by_node[node] = Import.bulk_create(self.context, node)
+        return imports
 
 
 def get_absolute_module_for_import(
@@ -188,3 +253,15 @@ def get_absolute_module_for_import(
         # append an `.__init__` module.
         full_module_name += ".__init__"  # type: ignore[operator]
     return get_absolute_module_for_import_or_raise(full_module_name, node)
+
+
+def get_absolute_module_for_ast_import(
+    full_module_name: str, filename: str, node: ast.ImportFrom
+) -> Optional[str]:
+    """Same as `get_absolute_module_for_import`, but for a stdlib `ast.ImportFrom` node.
+
+    Returns None if the relative import goes past the root of the repo.
+    """
+    if filename.endswith("__init__.py") and node.level:
+        full_module_name += ".__init__"
+    return get_absolute_module(full_module_name, node.module, node.level)
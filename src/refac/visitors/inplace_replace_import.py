@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
-from typing import cast, Optional, Sequence, Set, Tuple, Union
+from typing import Callable, cast, Optional, Sequence, Set, Tuple, Union
 
 import libcst as cst
 from libcst.codemod import CodemodContext, ContextAwareTransformer
 from libcst.metadata import ScopeProvider
 from libcst.metadata.scope_provider import Scope
 
-from .import_utils import Import
+from .import_utils import Import, ImportTable
 
 
 class InplaceReplaceImportVisitor(ContextAwareTransformer):
@@ -46,6 +46,9 @@ class InplaceReplaceImportVisitor(ContextAwareTransformer):
         self,
         context: CodemodContext,
         replacements: Optional[Set[Tuple[Import, Import]]] = None,
+        is_unused: Optional[
+            Callable[[Union[cst.Import, cst.ImportFrom], Import], bool]
+        ] = None,
     ):
         super().__init__(context)
         self.replacements = context.scratch.get(
@@ -55,6 +58,17 @@ class InplaceReplaceImportVisitor(ContextAwareTransformer):
             remove: add for (remove, add) in self.replacements
         }
         self.scheduled_additions: Set[Import] = set()
+        self.import_table = ImportTable.get(context)
+        # Lets `ReplaceImportCodemod` run this visitor as part of its own traversal,
+        # reusing the scopes it already resolved.
+        if is_unused is not None:
+            self.is_unused = is_unused  # type: ignore[assignment]
+
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        # Only import statements change, and they are never inside an expression.
+        if isinstance(node, cst.BaseExpression):
+            return False
+        return super().on_visit(node)
 
     def leave_ImportFrom(
         self, original: cst.ImportFrom, updated: cst.ImportFrom
@@ -71,7 +85,8 @@ class InplaceReplaceImportVisitor(ContextAwareTransformer):
         original: Union[cst.Import, cst.ImportFrom],
         updated: Union[cst.Import, cst.ImportFrom],
     ) -> Union[cst.Import, cst.ImportFrom, cst.RemovalSentinel]:
-        imports = Import.bulk_create(self.context, updated)
+        # `updated` has the same imports as `original`, which are already in the table.
+        imports = self.import_table.imports(original)
         removes = (im for im in imports if im in self.scheduled_replacements)
         for remove in sorted(removes, key=lambda im: im.key):
             add = self.scheduled_replacements[remove]
@@ -5,7 +5,6 @@ from libcst.codemod import (
     CodemodContext,
     VisitorBasedCodemodCommand,
 )
-from libcst.codemod._visitor import ContextAwareVisitor
 from libcst.codemod.visitors import (
     RemoveImportsVisitor,
     ImportItem,
@@ -18,49 +17,7 @@ from libcst.metadata.scope_provider import (
 from libcst.helpers import get_full_name_for_node_or_raise
 from libcst.metadata.name_provider import FullyQualifiedNameProvider
 
-
-class CollectAssociatedImportsVisitor(ContextAwareVisitor):
-    def __init__(self, context: CodemodContext, symbols_to_remove: set[str]) -> None:
-        super().__init__(context)
-        self.symbols_to_remove = symbols_to_remove
-        metadata_wrapper = self.context.wrapper
-        if metadata_wrapper is None:
-            raise Exception("Cannot look up scope, metadata is not computed for node!")
-        self.scope_provider = metadata_wrapper.resolve(ScopeProvider)
-
-    def collect(self, node: Union[cst.Name, cst.Attribute]) -> None:
-        scope = self.scope_provider.get(node)
-        if scope is None:
-            return
-
-        name = get_full_name_for_node_or_raise(node)
-        if name in self.symbols_to_remove:
-            return
-
-        for assignment in scope[name]:
-            if isinstance(assignment, ImportAssignment):
-                if assignment.scope == scope.globals:
-                    if isinstance(assignment.node, (cst.Import, cst.ImportFrom)):
-                        RemoveImportsVisitor.remove_unused_import_by_node(
-                            self.context, assignment.node
-                        )
-                        RemoveSymbolsVisitor.add_associated_import_by_node(
-                            self.context, assignment.node, name
-                        )
-            elif (
-                isinstance(assignment, Assignment) and assignment.scope == scope.globals
-            ):
-                RemoveSymbolsVisitor.add_associated_import(
-                    self.context, ImportItem(self.context.full_module_name, name, None)
-                )
-
-    def visit_Name(self, node: cst.Name) -> Optional[bool]:
-        self.collect(node)
-        return True
-
-    def visit_Attribute(self, node: cst.Attribute) -> Optional[bool]:
-        self.collect(node)
-        return True
+from refac.visitors.symbol_graph import SymbolGraph
 
 
 class RemoveSymbolsVisitor(VisitorBasedCodemodCommand):
@@ -71,6 +28,9 @@ class RemoveSymbolsVisitor(VisitorBasedCodemodCommand):
 
     Associated imports are collected on the scratch context.
     These can be used to add missing imports when moving the imports.
+
+    With `move_dependencies`, symbols that only the removed symbols use, directly or
+    not, are removed too and listed as "dependencies" on the scratch context.
     """
 
     CONTEXT_KEY = "RemoveSymbolsVisitor"
@@ -78,7 +38,7 @@ class RemoveSymbolsVisitor(VisitorBasedCodemodCommand):
 
     @classmethod
     def add_removed_node(cls, context: CodemodContext, node: cst.CSTNode) -> None:
-        context.scratch[cls.CONTEXT_KEY]["nodes"].add(node)
+        context.scratch[cls.CONTEXT_KEY]["nodes"].append(node)
 
     @classmethod
     def add_associated_import(cls, context: CodemodContext, item: ImportItem) -> None:
@@ -125,17 +85,62 @@ class RemoveSymbolsVisitor(VisitorBasedCodemodCommand):
                         ),
                     )
 
-    def __init__(self, context: CodemodContext, symbols_to_remove: set[str]) -> None:
+    def __init__(
+        self,
+        context: CodemodContext,
+        symbols_to_remove: set[str],
+        move_dependencies: bool = False,
+    ) -> None:
         super().__init__(context)
         assert all(
             "." not in symbol for symbol in symbols_to_remove
         ), "Cannot remove symbols with '.' in them"
-        self.symbols_to_remove: set[str] = symbols_to_remove
+        self.symbols_to_remove: set[str] = set(symbols_to_remove)
+        self.move_dependencies = move_dependencies
+        self.graph: Optional[SymbolGraph] = None
+        # Removed nodes are kept in module order, to add them back in the same order.
         self.context.scratch[self.CONTEXT_KEY] = {
             "imports": set(),
-            "nodes": set(),
+            "nodes": [],
+            "dependencies": set(),
         }
 
+    def visit_Module(self, node: cst.Module) -> Optional[bool]:
+        self.graph = SymbolGraph(node, self.metadata[ScopeProvider])
+        if self.move_dependencies:
+            dependencies = self.graph.dependencies(self.symbols_to_remove)
+            self.context.scratch[self.CONTEXT_KEY]["dependencies"] = dependencies
+            self.symbols_to_remove |= dependencies
+        return True
+
+    def collect_associated_imports(self, node: cst.CSTNode) -> None:
+        """Collect the imports and globals used by removed `node`.
+
+        Imports only used by `node` are removed, and all of them are listed on the
+        scratch context.
+        """
+        assert self.graph is not None
+        i = self.graph.statement_of(node)
+        if i is None:
+            return
+        for name, assignments in self.graph.uses[i].items():
+            if name in self.symbols_to_remove:
+                continue
+            for assignment in assignments:
+                if isinstance(assignment, ImportAssignment):
+                    if isinstance(assignment.node, (cst.Import, cst.ImportFrom)):
+                        RemoveImportsVisitor.remove_unused_import_by_node(
+                            self.context, assignment.node
+                        )
+                        self.add_associated_import_by_node(
+                            self.context, assignment.node, name
+                        )
+                elif isinstance(assignment, Assignment):
+                    self.add_associated_import(
+                        self.context,
+                        ImportItem(self.context.full_module_name, name, None),
+                    )
+
     def visit_FunctionDef(self, node: cst.FunctionDef) -> Optional[bool]:
         return False
 
@@ -164,9 +169,7 @@ class RemoveSymbolsVisitor(VisitorBasedCodemodCommand):
     ]:
         if original_node.name.value in self.symbols_to_remove:
             self.add_removed_node(self.context, original_node)
-            original_node.visit(
-                CollectAssociatedImportsVisitor(self.context, self.symbols_to_remove)
-            )
+            self.collect_associated_imports(original_node)
             return cst.RemoveFromParent()
         return super().leave_FunctionDef(original_node, updated_node)
 
@@ -177,9 +180,7 @@ class RemoveSymbolsVisitor(VisitorBasedCodemodCommand):
     ]:
         if original_node.name.value in self.symbols_to_remove:
             self.add_removed_node(self.context, original_node)
-            original_node.visit(
-                CollectAssociatedImportsVisitor(self.context, self.symbols_to_remove)
-            )
+            self.collect_associated_imports(original_node)
             return cst.RemoveFromParent()
         return super().leave_ClassDef(original_node, updated_node)
 
@@ -199,6 +200,7 @@ class RemoveSymbolsVisitor(VisitorBasedCodemodCommand):
                         and target.value in self.symbols_to_remove
                     ):
                         self.add_removed_node(self.context, original_node)
+                        self.collect_associated_imports(original_node)
                         return cst.RemoveFromParent()
 
             if isinstance(node, cst.AnnAssign):
@@ -208,6 +210,7 @@ class RemoveSymbolsVisitor(VisitorBasedCodemodCommand):
                     and target.value in self.symbols_to_remove
                 ):
                     self.add_removed_node(self.context, original_node)
+                    self.collect_associated_imports(original_node)
                     return cst.RemoveFromParent()
 
         return super().leave_SimpleStatementLine(original_node, updated_node)
@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
+import time
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple, Type, Union
+from typing import cast, Dict, List, Optional, Set, Tuple, Union
 
 import libcst as cst
 from libcst.codemod import (
-    Codemod,
     CodemodCommand,
     CodemodContext,
     VisitorBasedCodemodCommand,
@@ -13,7 +13,9 @@ from libcst.helpers import get_full_name_for_node
 from libcst.metadata import Assignment, ScopeProvider
 from libcst.metadata.scope_provider import QualifiedNameSource, Scope
 
-from .import_utils import Import
+from refac import timing
+
+from .import_utils import dotted_name_node, Import, ImportTable
 from .inplace_replace_import import InplaceReplaceImportVisitor
 
 # Possible refactors:
@@ -44,6 +46,96 @@ class Pair:
         self.new_format = new_format
 
 
+class PairTrie:
+    """Index of `Pair`s by the dotted parts of `Pair.old`.
+
+    Finding the pair for a qualified name walks one node per part of the name,
+    no matter how many pairs there are.
+
+    >>> PairTrie([Pair(ctx, Import("a.b"), Import("x"), None)]).find("a.b.c")
+    Pair(old=Import("a.b"), ...)
+    """
+
+    class Node:
+        __slots__ = ("children", "index")
+
+        def __init__(self) -> None:
+            self.children: Dict[str, "PairTrie.Node"] = {}
+            self.index: Optional[int] = None
+
+    def __init__(self, pairs: List[Pair]) -> None:
+        self.pairs = pairs
+        self.root = PairTrie.Node()
+        for i, pair in enumerate(pairs):
+            node = self.root
+            for part in pair.old.parts:
+                node = node.children.setdefault(part, PairTrie.Node())
+            if node.index is None:
+                node.index = i
+
+    @classmethod
+    def parse(
+        cls, context: CodemodContext, old: str, new: str, format: Optional[str]
+    ) -> "PairTrie":
+        """The trie of the comma separated `old`, `new` and `format` renames.
+
+        Renames that change nothing are left out.
+        """
+        olds = [x.strip() for x in old.split(",")]
+        news = [x.strip() for x in new.split(",")]
+        formats: list[Optional[str]] = (
+            [x.strip() for x in format.split(",")]
+            if format is not None
+            else [None] * len(news)
+        )
+        if len(olds) != len(news):
+            raise ValueError(
+                f"`old` and `new` must be the same length. Got {len(olds)} and {len(news)}."
+            )
+        if len(news) != len(formats):
+            raise ValueError(
+                f"`format` must be the same length as `new` or empty. Got {len(formats)} and {len(news)}."
+            )
+
+        pairs = [
+            Pair(context, Import(olds[i]), Import(news[i]), formats[i])
+            for i in range(len(olds))
+        ]
+        return cls([p for p in pairs if p.old != p.new or p.new_format is not None])
+
+    def find_index(self, qname: str) -> Optional[int]:
+        """Index of the first pair whose `old` matches `qname` (see `Import.match`)."""
+        best: Optional[int] = None
+        node = self.root
+        for part in qname.split("."):
+            child = node.children.get(part)
+            if child is None:
+                break
+            node = child
+            if node.index is not None and (best is None or node.index < best):
+                best = node.index
+        return best
+
+    def find(self, qname: str) -> Optional[Pair]:
+        index = self.find_index(qname)
+        return None if index is None else self.pairs[index]
+
+    def may_match(self, name: str) -> bool:
+        """True if a usage of the import `name` may match a pair.
+
+        That is when a pair's `old` is `name`, a parent of `name`, or under `name`.
+        """
+        node = self.root
+        for part in name.split("."):
+            child = node.children.get(part)
+            if child is None:
+                return False
+            node = child
+            if node.index is not None:
+                return True
+        return True
+
+
 class ReplaceImportCodemod(VisitorBasedCodemodCommand):
     """Replace any Python symbol with another.
 
@@ -104,51 +196,96 @@ class ReplaceImportCodemod(VisitorBasedCodemodCommand):
         old: str,
         new: str,
         format: Optional[str],
+        pair_trie: Optional[PairTrie] = None,
     ):
+        """`pair_trie` is `PairTrie.parse(context, old, new, format)` if it was already
+        built, so that many files can share it instead of parsing the renames again."""
         super().__init__(context)
-        olds = [x.strip() for x in old.split(",")]
-        news = [x.strip() for x in new.split(",")]
-        formats: list[Optional[str]] = (
-            [x.strip() for x in format.split(",")]
-            if format is not None
-            else [None] * len(news)
-        )
-        if len(olds) != len(news):
-            raise ValueError(
-                f"`old` and `new` must be the same length. Got {len(olds)} and {len(news)}."
-            )
-        if len(news) != len(formats):
-            raise ValueError(
-                f"`format` must be the same length as `new` or empty. Got {len(formats)} and {len(news)}."
-            )
-
-        pairs = [
-            Pair(context, Import(olds[i]), Import(news[i]), formats[i])
-            for i in range(len(olds))
-        ]
-        self.pairs = [p for p in pairs if p.old != p.new or p.new_format is not None]
+        if pair_trie is None:
+            pair_trie = PairTrie.parse(context, old, new, format)
+        self.pairs = pair_trie.pairs
+        self.pair_trie = pair_trie
 
         # When present, adds a comment on nearest cst.SimpleStatementLine
         self.add_comment: str = ""
 
-    def transform_module(self, tree: cst.Module) -> cst.Module:
-        # Not calling naive super() to skip the `CodemodCommand.transform_module`
-        tree = super(CodemodCommand, self).transform_module(tree)
+        # First part of the keys of imports in the module that may match a pair.
+        # Usages that start with anything else can be skipped without a scope lookup.
+        self.candidate_keys: Set[str] = set()
 
-        supported_transforms: Dict[str, Type[Codemod]] = {
-            InplaceReplaceImportVisitor.CONTEXT_KEY: InplaceReplaceImportVisitor,
-        }
+        # The module's imports, shared with `InplaceReplaceImportVisitor`.
+        self.import_table = ImportTable(context)
 
-        for key, transform in supported_transforms.items():
-            if key in self.context.scratch:
-                tree = self._instantiate_and_run(transform, tree)
+        # Nodes of the usages that were replaced, and the new usages by their first
+        # part with the scope they are in. Used to tell if an import is still used
+        # without resolving the scopes again.
+        self.replaced_nodes: Set[cst.CSTNode] = set()
+        self.new_usages: Dict[str, List[Tuple[Scope, str]]] = {}
 
-        return tree
+        # When metadata was resolved and the tree visited, for profiling.
+        self.spans: List[timing.Span] = []
+
+    def transform_module(self, tree: cst.Module) -> cst.Module:
+        start = time.perf_counter()
+        # Not calling naive super() to skip the `CodemodCommand.transform_module`
+        updated = super(CodemodCommand, self).transform_module(tree)
+        # Everything before the visit itself is copying the tree and resolving metadata.
+        visit_start = self.spans[-1][1] if self.spans else time.perf_counter()
+        self.spans.insert(len(self.spans) - 1, ("metadata", start, visit_start))
+        return updated
+
+    def transform_module_impl(self, tree: cst.Module) -> cst.Module:
+        with timing.span(self.spans, "transform"):
+            return super().transform_module_impl(tree)
 
     def visit_Module(self, node: cst.Module) -> bool:
         if len(self.pairs) == 0:
             # Nothing to change, so exit early.
             return False
+        self.replaced_nodes = set()
+        self.new_usages = {}
+        self.candidate_keys = self.collect_candidate_keys(node)
+        # Without any matching imports there is nothing to change either.
+        return len(self.candidate_keys) > 0
+
+    def collect_candidate_keys(self, node: cst.Module) -> Set[str]:
+        self.import_table = ImportTable.build(self.context, node)
+        return {
+            key
+            for key, imports in self.import_table.by_key.items()
+            if any(self.pair_trie.may_match(im.name) for im in imports)
+        }
+
+    def leave_Module(self, original: cst.Module, updated: cst.Module) -> cst.Module:
+        # Edit the import statements once every usage has been replaced, since that
+        # decides which of the old imports are now unused.
+        if InplaceReplaceImportVisitor.CONTEXT_KEY not in self.context.scratch:
+            return updated
+        return updated.visit(
+            InplaceReplaceImportVisitor(self.context, is_unused=self.is_unused)
+        )
+
+    def is_unused(self, node: Union[cst.Import, cst.ImportFrom], im: Import) -> bool:
+        """True if `im` has no references left once the usages have been replaced."""
+        scope = self.get_metadata(ScopeProvider, node, None)
+        if scope is None:
+            # Without a scope its references are unknown, so keep the import.
+            return False
+        assignments = scope[im.key]
+        for assignment in assignments:
+            for reference in assignment.references:
+                if reference.node not in self.replaced_nodes:
+                    return False
+        for usage_scope, new_usage in self.new_usages.get(im.key.split(".", 1)[0], []):
+            # Like `ScopeProvider`, attribute the access to its longest dotted prefix
+            # that is assigned in the scope.
+            parts = new_usage.split(".")
+            for i in range(len(parts), 0, -1):
+                name = ".".join(parts[:i])
+                if name in usage_scope:
+                    if any(a in assignments for a in usage_scope[name]):
+                        return False
+                    break
         return True
 
     def visit_Import(self, node: cst.Import) -> bool:
@@ -170,7 +307,7 @@ class ReplaceImportCodemod(VisitorBasedCodemodCommand):
         self, node: Union[cst.Import, cst.ImportFrom]
     ) -> None:
         scope = self.get_metadata(ScopeProvider, node)
-        imports = Import.bulk_create(self.context, node)
+        imports = self.import_table.imports(node)
         unused_imports: List[Import] = []
         for old_import in imports:
             is_unused = all(len(assignment.references) == 0 for assignment in scope[old_import.key])  # type: ignore[index]
@@ -179,10 +316,9 @@ class ReplaceImportCodemod(VisitorBasedCodemodCommand):
 
         matches: List[Tuple[Import, Pair]] = []
         for old_import in unused_imports:
-            for pair in self.pairs:
-                if pair.old.match(old_import.name):
-                    matches.append((old_import, pair))
-                    break
+            pair = self.pair_trie.find(old_import.name)
+            if pair is not None:
+                matches.append((old_import, pair))
 
         for (old_import, pair) in matches:
             rest = old_import.name.removeprefix(pair.old.name)  # type: ignore
@@ -207,10 +343,13 @@ class ReplaceImportCodemod(VisitorBasedCodemodCommand):
         if self.add_comment:
             comment = self.add_comment
             self.add_comment = ""
-            return updated.with_deep_changes(
-                old_node=updated.trailing_whitespace,
-                whitespace=cst.SimpleWhitespace("  "),
-                comment=cst.Comment(comment),
+            # Only replace the trailing whitespace, so that the import statements in
+            # the line are the same nodes and keep their scopes.
+            return updated.with_changes(
+                trailing_whitespace=updated.trailing_whitespace.with_changes(
+                    whitespace=cst.SimpleWhitespace("  "),
+                    comment=cst.Comment(comment),
+                )
             )
         return updated
 
@@ -221,6 +360,8 @@ class ReplaceImportCodemod(VisitorBasedCodemodCommand):
     ) -> cst.BaseExpression:
         if not is_simple_attribute(original):
             return updated
+        if get_leftmost_name(original) not in self.candidate_keys:
+            return updated
 
         try:
             scope = self.get_metadata(ScopeProvider, original)
@@ -229,30 +370,34 @@ class ReplaceImportCodemod(VisitorBasedCodemodCommand):
         if scope is None:
             return updated
 
-        for pair in self.pairs:
-            old_import = self.get_old_import(scope, original, pair)
-            if not old_import:
-                continue
-            old_usage = get_full_name_for_node(original)
-            (new_import, new_usage) = self.get_new_import_and_usage(old_import, old_usage, pair)  # type: ignore[arg-type]
+        match = self.get_old_import(scope, original)
+        if not match:
+            return updated
+        (old_import, pair) = match
+        old_usage = get_full_name_for_node(original)
+        (new_import, new_usage) = self.get_new_import_and_usage(old_import, old_usage, pair)  # type: ignore[arg-type]
 
-            # Check if we are going to introduce variable shadowing
-            # if old_usage != new_usage:
-            self.check_for_variable_shadowing(scope, old_import, new_import)
+        # Check if we are going to introduce variable shadowing
+        # if old_usage != new_usage:
+        self.check_for_variable_shadowing(scope, old_import, new_import)
 
-            InplaceReplaceImportVisitor.replace_import(
-                self.context, old_import, new_import
-            )
+        InplaceReplaceImportVisitor.replace_import(self.context, old_import, new_import)
 
-            return cst.parse_expression(
-                new_usage,
-                config=self.context.module.config_for_parsing,  # type: ignore[union-attr]
-            )
-        return updated
+        node: cst.BaseExpression = original
+        while isinstance(node, cst.Attribute):
+            self.replaced_nodes.add(node)
+            node = node.value
+        self.replaced_nodes.add(node)
+        self.new_usages.setdefault(new_usage.split(".", 1)[0], []).append(
+            (scope, new_usage)
+        )
+
+        return dotted_name_node(new_usage)
 
     def get_old_import(
-        self, scope: Scope, original: Union[cst.Name, cst.Attribute], pair: Pair
-    ) -> Optional[Import]:
+        self, scope: Scope, original: Union[cst.Name, cst.Attribute]
+    ) -> Optional[Tuple[Import, Pair]]:
+        """Find the import that `original` refers to, and the first pair that renames it."""
         is_imported = QualifiedNameSource.IMPORT in {
             qn.source for qn in scope.get_qualified_names_for(original)
         }
@@ -270,21 +415,18 @@ class ReplaceImportCodemod(VisitorBasedCodemodCommand):
             and isinstance(a.node, (cst.Import, cst.ImportFrom))
         }
 
-        def is_possible_old_import(im: Import) -> bool:
-            # Usage must match key or usage must match a module path.
-            if old_usage != im.key and not old_usage.removeprefix(im.key).startswith("."):  # type: ignore[union-attr]
-                return False
-            qname = get_fully_qualified_name(im, old_usage)  # type: ignore[arg-type]
-            return pair.old.match(qname)
-
-        possible_imports = [
-            im
-            for node in import_nodes
-            for im in Import.bulk_create(self.context, node)
-            if is_possible_old_import(im)
-        ]
-
-        if not possible_imports:
+        best: Optional[Tuple[int, Import]] = None
+        for node in import_nodes:
+            for im in self.import_table.imports(node):
+                # Usage must match key or usage must match a module path.
+                if old_usage != im.key and not old_usage.removeprefix(im.key).startswith("."):  # type: ignore[union-attr]
+                    continue
+                qname = get_fully_qualified_name(im, old_usage)  # type: ignore[arg-type]
+                index = self.pair_trie.find_index(qname)
+                if index is not None and (best is None or index < best[0]):
+                    best = (index, im)
+
+        if best is None:
             return None
 
         if len(assignments) > 1:
@@ -294,7 +436,8 @@ class ReplaceImportCodemod(VisitorBasedCodemodCommand):
             self.add_comment += msg
             return None
 
-        return possible_imports[0]
+        (index, old_import) = best
+        return (old_import, self.pairs[index])
 
     def get_new_import_and_usage(
         self, old_import: Import, old_usage: str, pair: Pair
@@ -359,6 +502,17 @@ def get_fully_qualified_name(im: Import, usage: str) -> str:
     return f"{import_part}{usage_part}"
 
 
+def get_leftmost_name(node: Union[cst.Name, cst.Attribute]) -> str:
+    """The first part of a simple attribute.
+
+    >>> get_leftmost_name(cst.parse_expression("a.b.c"))
+    "a"
+    """
+    while isinstance(node, cst.Attribute):
+        node = node.value  # type: ignore[assignment]
+    return cast(cst.Name, node).value
+
+
 def is_simple_attribute(node: cst.BaseExpression) -> bool:
     """A simple attribute is a dotted expression made of cst.Name nodes.
 
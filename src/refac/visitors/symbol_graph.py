@@ -0,0 +1,140 @@
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Set
+
+import libcst as cst
+from libcst.metadata.scope_provider import Assignment, BaseAssignment, Scope
+
+
+class SymbolGraph:
+    """The top-level statements of a module and the global names each of them uses.
+
+    Built once per module from its scopes, so that finding everything a set of
+    symbols depends on is a single walk over the graph:
+
+        def _f(): pass
+        def _g(): return _f
+        def h(): return _g
+
+    `uses` of `h` is {"_g"}, and `dependencies({"h"})` is {"_f", "_g"} since nothing
+    else uses them.
+
+    Symbols are the names defined by a top-level `def`, `class` or assignment, like
+    `RemoveSymbolsVisitor` removes them. Any other top-level code, like an `if` block,
+    is a statement without symbols that can never move.
+    """
+
+    def __init__(
+        self, module: cst.Module, scopes: Mapping[cst.CSTNode, Optional[Scope]]
+    ) -> None:
+        # The index of the top-level statement every node is part of.
+        self.statement_index: Dict[cst.CSTNode, int] = {}
+        visitor = _IndexVisitor(self.statement_index)
+        for i, statement in enumerate(module.body):
+            visitor.index = i
+            statement.visit(visitor)
+
+        # Names defined by each statement, and the statement defining each symbol.
+        self.names: List[Set[str]] = [defined_names(s) for s in module.body]
+        self.definitions: Dict[str, int] = {}
+        # Global names used by each statement, with their assignments.
+        self.uses: List[Dict[str, List[BaseAssignment]]] = [{} for _ in module.body]
+
+        definers: Dict[str, Set[int]] = {}
+        scope = scopes.get(module)
+        global_scope = scope.globals if scope is not None else None
+        for assignment in global_scope.assignments if global_scope else ():
+            name = assignment.name
+            if isinstance(assignment, Assignment):
+                i = self.statement_index.get(assignment.node)
+                if i is not None:
+                    definers.setdefault(name, set()).add(i)
+            for access in assignment.references:
+                j = self.statement_index.get(access.node)
+                if j is not None:
+                    self.uses[j].setdefault(name, []).append(assignment)
+
+        for name, statements in definers.items():
+            # Names also assigned elsewhere, e.g. in an `if` block, cannot move.
+            if len(statements) != 1:
+                continue
+            (i,) = statements
+            if name in self.names[i] and not is_dunder(name):
+                self.definitions[name] = i
+
+    def statement_of(self, node: cst.CSTNode) -> Optional[int]:
+        return self.statement_index.get(node)
+
+    def used_symbols(self, i: int) -> Iterable[int]:
+        """Statements defining the symbols used by statement `i`."""
+        for name in self.uses[i]:
+            j = self.definitions.get(name)
+            if j is not None and j != i:
+                yield j
+
+    def is_private(self, i: int) -> bool:
+        """Whether statement `i` only defines names starting with an underscore."""
+        return bool(self.names[i]) and all(name.startswith("_") for name in self.names[i])
+
+    def reachable(self, start: Iterable[int], expand: Callable[[int], bool]) -> Set[int]:
+        """Statements used by `start`, directly or not, going on only from `expand`."""
+        seen = set(start)
+        stack = list(seen)
+        while stack:
+            i = stack.pop()
+            if not expand(i):
+                continue
+            for j in self.used_symbols(i):
+                if j not in seen:
+                    seen.add(j)
+                    stack.append(j)
+        return seen
+
+    def dependencies(self, symbols: Set[str]) -> Set[str]:
+        """Private symbols used, directly or not, by `symbols` and by nothing else.
+
+        These can move along with `symbols` instead of being imported back from the
+        old module. Public symbols never move along, since they may be used by other
+        modules. Both walks visit each statement and use at most once.
+        """
+        moving = {self.definitions[s] for s in symbols if s in self.definitions}
+        closure = self.reachable(moving, lambda i: i in moving or self.is_private(i))
+        private = {i for i in closure - moving if self.is_private(i)}
+        # Whatever the rest of the module uses stays, except for the moved symbols
+        # themselves, which it imports back.
+        others = [i for i in range(len(self.names)) if i not in moving and i not in private]
+        staying = self.reachable(others, lambda i: i not in moving)
+        return {
+            name
+            for i in private - staying
+            for name in self.names[i]
+            if self.definitions.get(name) == i
+        } - symbols
+
+
+class _IndexVisitor(cst.CSTVisitor):
+    def __init__(self, statement_index: Dict[cst.CSTNode, int]) -> None:
+        self.statement_index = statement_index
+        self.index = -1
+
+    def on_visit(self, node: cst.CSTNode) -> bool:
+        self.statement_index[node] = self.index
+        return True
+
+
+def defined_names(statement: cst.CSTNode) -> Set[str]:
+    """Names of the symbols defined by a top-level statement."""
+    if isinstance(statement, (cst.FunctionDef, cst.ClassDef)):
+        return {statement.name.value}
+    names = set()
+    if isinstance(statement, cst.SimpleStatementLine):
+        for node in statement.body:
+            if isinstance(node, cst.Assign):
+                names.update(
+                    t.target.value for t in node.targets if isinstance(t.target, cst.Name)
+                )
+            elif isinstance(node, cst.AnnAssign) and isinstance(node.target, cst.Name):
+                names.add(node.target.value)
+    return names
+
+
+def is_dunder(name: str) -> bool:
+    return name.startswith("__") and name.endswith("__")
@@ -0,0 +1,58 @@
+import ast
+import contextlib
+import io
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from benchmarks import run
+from benchmarks.generate import RepoSpec, generate
+from benchmarks.run import compare
+
+
+class GenerateTest(unittest.TestCase):
+    def test_generate(self):
+        spec = RepoSpec(modules=12, fan_in=3, relative_ratio=0.5, lines=40, package_size=5)
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            generate(root, spec)
+            self.assertTrue((root / ".git").is_dir())
+            self.assertEqual(
+                sorted(str(p.relative_to(root)) for p in root.glob("app/*/__init__.py")),
+                ["app/pkg0/__init__.py", "app/pkg1/__init__.py", "app/pkg2/__init__.py"],
+            )
+            imports = 0
+            for i in range(spec.modules):
+                source = (root / spec.filename(i)).read_text()
+                self.assertAlmostEqual(len(source.splitlines()), spec.lines, delta=6)
+                tree = ast.parse(source)
+                imports += sum(
+                    len(node.names)
+                    for node in tree.body
+                    if isinstance(node, (ast.Import, ast.ImportFrom))
+                )
+            self.assertGreaterEqual(imports, spec.modules * spec.fan_in)
+
+
+class CompareTest(unittest.TestCase):
+    def test_compare(self):
+        def results(total):
+            return {"spec": {}, "jobs": 1, "results": {"file": {"total": total}}}
+
+        self.assertEqual(compare(results(1.1), results(1.0), 0.2), [])
+        self.assertEqual(
+            compare(results(1.5), results(1.0), 0.2),
+            ["file: 1.500s is 50% slower than the baseline (1.000s)"],
+        )
+
+    def test_missing_baseline(self):
+        stderr = io.StringIO()
+        with TemporaryDirectory() as temp_dir, mock.patch.object(
+            run, "benchmark"
+        ) as benchmark, contextlib.redirect_stderr(stderr):
+            with self.assertRaises(SystemExit) as exit:
+                run.main(["--baseline", str(Path(temp_dir) / "baseline.json")])
+        self.assertEqual(exit.exception.code, 2)
+        self.assertIn("--output", stderr.getvalue())
+        benchmark.assert_not_called()
@@ -0,0 +1,232 @@
+import contextlib
+import io
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from unittest import mock
+
+from refac import codemod, memory
+from refac.result_cache import ResultCache
+
+
+class CodemodFileTest(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name).resolve()
+        patcher = mock.patch.object(codemod, "ROOT_DIR", self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, filename: str, code: str) -> str:
+        path = self.root / filename
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(dedent(code))
+        return str(path)
+
+    def test_changed(self):
+        filename = self.write(
+            "a/b.py",
+            """
+            from . import c
+            c.d
+            """,
+        )
+        result = codemod.codemod_file(filename, ["a.c"], ["x.y"])
+        self.assertTrue(result.changed)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.code, "\nfrom x import y\ny.d\n")
+        self.assertEqual(
+            list(result.timings),
+            ["read", "prefilter", "parse", "metadata", "transform", "render"],
+        )
+
+    def test_coding_cookie(self):
+        path = self.root / "a/b.py"
+        path.parent.mkdir(parents=True)
+        path.write_bytes(
+            "# -*- coding: latin-1 -*-\nfrom a import c\ns = 'é'\n".encode("latin-1")
+        )
+        results = codemod.codemod_files([str(path)], ["a.c"], ["x.y"])
+        self.assertIsNone(results[0].error)
+        self.assertEqual(results[0].encoding, "iso-8859-1")
+        self.assertEqual(
+            path.read_bytes(),
+            "# -*- coding: latin-1 -*-\nfrom x import y\ns = 'é'\n".encode("latin-1"),
+        )
+
+    def test_unchanged(self):
+        filename = self.write("a/b.py", "from a import c\n")
+        result = codemod.codemod_file(filename, ["q.r"], ["x.y"])
+        self.assertFalse(result.changed)
+        self.assertIsNone(result.code)
+        self.assertIsNone(result.error)
+
+    def test_skips_files_without_matching_imports(self):
+        filename = self.write(
+            "a/b.py",
+            """
+            # a.c
+            from a import cd
+            s = "a.c"
+            """,
+        )
+        with mock.patch.object(codemod, "parse_module") as parse_module:
+            result = codemod.codemod_file(filename, ["a.c"], ["x.y"])
+        parse_module.assert_not_called()
+        self.assertFalse(result.changed)
+        self.assertIsNone(result.error)
+
+    def test_failed(self):
+        filename = self.write("a/b.py", "def (:\n")
+        result = codemod.codemod_file(filename, ["a.c"], ["x.y"])
+        self.assertFalse(result.changed)
+        self.assertIsNotNone(result.error)
+
+    def test_codemod_files_writes_changes(self):
+        changed = self.write("a/b.py", "from a import c\nc\n")
+        unchanged = self.write("a/d.py", "import os\n")
+        results = codemod.codemod_files([changed, unchanged], ["a.c"], ["x.y"])
+        self.assertEqual([r.changed for r in results], [True, False])
+        self.assertEqual(Path(changed).read_text(), "from x import y\ny\n")
+        self.assertEqual(Path(unchanged).read_text(), "import os\n")
+
+    def test_codemod_files_parses_renames_once(self):
+        filenames = [self.write(f"a/m{i}.py", "from a import c\nc\n") for i in range(3)]
+        codemod.renames.cache_clear()
+        with mock.patch.object(
+            codemod.PairTrie, "parse", wraps=codemod.PairTrie.parse
+        ) as parse:
+            results = codemod.codemod_files(filenames, ["a.c"], ["x.y"])
+        self.assertEqual([r.changed for r in results], [True] * 3)
+        parse.assert_called_once()
+
+    def test_worker_codemod_file(self):
+        filename = self.write("a/b.py", "import os\n")
+        with mock.patch.object(codemod, "_worker_args", ()):
+            codemod.init_worker(("a.c",), ("x.y",), None, False)
+            result = codemod.worker_codemod_file(filename, b"from a import c\nc\n")
+        self.assertEqual(result.code, "from x import y\ny\n")
+
+    def test_codemod_files_in_parallel(self):
+        filenames = [
+            self.write(f"a/m{i}.py", "from a import c\nc\n" * (i + 1)) for i in range(4)
+        ]
+        filenames.append(self.write("a/broken.py", "def (:\n"))
+        with mock.patch.object(codemod, "PARALLEL_MIN_FILES", 2):
+            results = codemod.codemod_files(filenames, ["a.c"], ["x.y"], jobs=2)
+        self.assertEqual([r.filename for r in results], filenames)
+        self.assertEqual([r.changed for r in results], [True] * 4 + [False])
+        self.assertIsNotNone(results[-1].error)
+        self.assertTrue(all("read" in r.timings for r in results))
+
+    def test_codemod_files_under_memory_limit(self):
+        filenames = [
+            self.write(f"a/m{i}.py", "from a import c\nc\n" * (i + 1)) for i in range(4)
+        ]
+        stderr = io.StringIO()
+        with memory.limit(1), contextlib.redirect_stderr(stderr), mock.patch.object(
+            codemod, "PARALLEL_MIN_FILES", 2
+        ):
+            results = codemod.codemod_files(filenames, ["a.c"], ["x.y"], jobs=3)
+        self.assertEqual([r.filename for r in results], filenames)
+        self.assertEqual([(r.changed, r.code) for r in results], [(True, None)] * 4)
+        self.assertEqual(Path(filenames[0]).read_text(), "from x import y\ny\n")
+        self.assertIn("Lowering the number of workers to 1.", stderr.getvalue())
+        self.assertTrue(all(r.max_rss > 0 for r in results))
+
+    def test_codemod_files_adapts_workers_to_memory(self):
+        filenames = [self.write(f"a/m{i}.py", "from a import c\nc\n") for i in range(8)]
+        near = iter([True, True])
+        stderr = io.StringIO()
+        with memory.limit(1 << 40), contextlib.redirect_stderr(stderr), mock.patch.object(
+            memory, "rss", return_value=1
+        ), mock.patch.object(
+            memory, "is_near_limit", side_effect=lambda used: next(near, False)
+        ):
+            results = codemod.codemod_files(filenames, ["a.c"], ["x.y"], jobs=3)
+        self.assertEqual([r.changed for r in results], [True] * 8)
+        self.assertEqual(
+            stderr.getvalue().splitlines()[:3],
+            [
+                "Using 0.0 MB of memory, near the limit. Lowering the number of workers to 2.",
+                "Using 0.0 MB of memory, near the limit. Lowering the number of workers to 1.",
+                "Using 0.0 MB of memory, well under the limit. Raising the number of workers to 2.",
+            ],
+        )
+
+    def test_codemod_files_in_process(self):
+        filenames = [self.write(f"a/m{i}.py", "from a import c\nc\n") for i in range(3)]
+        with mock.patch.object(codemod, "parallel_codemod_files") as parallel:
+            results = codemod.codemod_files(filenames, ["a.c"], ["x.y"], jobs=4)
+        parallel.assert_not_called()
+        self.assertEqual([r.changed for r in results], [True] * 3)
+
+        with mock.patch.object(codemod, "PARALLEL_MIN_BYTES", 8):
+            self.assertTrue(codemod.worth_a_pool(filenames))
+        self.assertFalse(codemod.worth_a_pool(filenames[:1]))
+
+    def test_codemod_files_retires_workers(self):
+        filenames = [self.write(f"a/m{i}.py", "from a import c\nc\n") for i in range(8)]
+        used = []
+
+        def is_well_under_limit(size: int) -> bool:
+            used.append(size)
+            return False
+
+        with memory.limit(1 << 40), contextlib.redirect_stderr(
+            io.StringIO()
+        ), mock.patch.object(memory, "rss", return_value=1), mock.patch.object(
+            memory, "is_near_limit", return_value=True
+        ), mock.patch.object(
+            memory, "is_well_under_limit", side_effect=is_well_under_limit
+        ):
+            results = list(
+                codemod.parallel_codemod_files(filenames, ["a.c"], ["x.y"], jobs=3)
+            )
+        self.assertEqual([r.changed for r in results], [True] * 8)
+        # The pools of 3 and 2 workers get at most 5 files before being replaced by
+        # one of 1 worker, and then only it and refac count towards the memory used.
+        self.assertEqual(len({r.pid for r in results[5:]}), 1)
+        self.assertEqual(used[-1], 2)
+
+    def test_codemod_file_with_cache(self):
+        cache = ResultCache(self.root / "cache")
+        filename = self.write("a/b.py", "from a import c\nc\n")
+        first = codemod.codemod_file(filename, ["a.c"], ["x.y"], cache)
+        second = codemod.codemod_file(filename, ["a.c"], ["x.y"], cache)
+        self.assertFalse(first.cached)
+        self.assertTrue(second.cached)
+        self.assertEqual((first.changed, first.code), (second.changed, second.code))
+
+        other_pairs = codemod.codemod_file(filename, ["a.c"], ["x.z"], cache)
+        self.assertFalse(other_pairs.cached)
+
+    def test_codemod_file_with_cache_in_package(self):
+        # Both files are module `a.b`, but `.c` is `a.c` in one and `a.b.c` in the other.
+        cache = ResultCache(self.root / "cache")
+        module = self.write("a/b.py", "from . import c\nc\n")
+        package = self.write("a/b/__init__.py", "from . import c\nc\n")
+        first = codemod.codemod_file(module, ["a.c"], ["x.y"], cache)
+        second = codemod.codemod_file(package, ["a.c"], ["x.y"], cache)
+        self.assertEqual((first.changed, first.code), (True, "from x import y\ny\n"))
+        self.assertEqual((second.cached, second.changed), (False, False))
+
+
+class ParseCacheTest(unittest.TestCase):
+    def tearDown(self) -> None:
+        codemod.enable_parse_cache(0)
+
+    def test_parse_cache(self):
+        self.assertIsNot(codemod.parse("a = 1\n"), codemod.parse("a = 1\n"))
+
+        codemod.enable_parse_cache(2)
+        first = codemod.parse("a = 1\n")
+        self.assertIs(codemod.parse("a = 1\n"), first)
+        codemod.parse("b = 1\n")
+        codemod.parse("c = 1\n")
+        self.assertIsNot(codemod.parse("a = 1\n"), first)
+
+        with memory.limit(1):
+            self.assertIsNot(codemod.parse("c = 1\n"), codemod.parse("c = 1\n"))
@@ -0,0 +1,115 @@
+import gc
+import io
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import unittest
+import warnings
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+from unittest import mock
+
+from refac import codemod, daemon
+from tests.temp_repo import TempRepoTest
+
+
+def fake_run(argv: List[str]) -> int:
+    print("moved", *argv)
+    print("warning", file=daemon.sys.stderr)
+    return 3
+
+
+class DaemonTest(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name).resolve()
+        self.socket_path = self.root / "daemon.sock"
+        # The daemon changes directory to $ROOT_DIR after each request.
+        self.addCleanup(os.chdir, os.getcwd())
+        for name, value in (
+            ("SOCKET_PATH", self.socket_path),
+            ("ROOT_DIR", self.root),
+            ("run", fake_run),
+        ):
+            patcher = mock.patch.object(daemon, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def start_server(self) -> None:
+        # Serve from another process, like the real daemon: redirecting stdout in a
+        # server thread would also redirect the client's output.
+        server = socketserver.UnixStreamServer(
+            str(self.socket_path), daemon.RequestHandler
+        )
+        process = multiprocessing.get_context("fork").Process(
+            target=server.serve_forever
+        )
+        process.start()
+        server.server_close()
+        self.addCleanup(process.join)
+        self.addCleanup(process.terminate)
+
+    def test_request_without_daemon(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            self.assertIsNone(daemon.request(["symbol", "a.Foo", "b.Foo"]))
+            self.assertFalse(daemon.request_is_served())
+            gc.collect()
+        self.assertEqual([w for w in caught if w.category is ResourceWarning], [])
+
+    def test_request(self):
+        self.start_server()
+        self.assertTrue(daemon.request_is_served())
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            exit_code = daemon.request(["symbol", "a.Foo", "b.Foo"])
+        self.assertEqual(exit_code, 3)
+        self.assertEqual(stdout.getvalue(), "moved symbol a.Foo b.Foo\n")
+        self.assertEqual(stderr.getvalue(), "warning\n")
+
+    def test_request_with_other_version(self):
+        self.start_server()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(self.socket_path))
+            message = {"version": "0.0.0", "cwd": str(self.root), "argv": ["plan", "p"]}
+            client.sendall(json.dumps(message).encode() + b"\n")
+            self.assertEqual(client.recv(1024), b"")
+
+
+class RunTest(TempRepoTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.write({"a/__init__.py": "", "a/m.py": "M = 1\n"})
+        # Enough importers for `--jobs` to start a pool outside of the daemon.
+        self.write({f"i{i}.py": f"from a.m import M\nI = {i}\n" for i in range(10)})
+        self.addCleanup(codemod.enable_parse_cache, 0)
+        codemod.enable_parse_cache(daemon.PARSE_CACHE_SIZE)
+
+    def run_refac(self, *argv: str) -> str:
+        stdout = io.StringIO()
+        with redirect_stdout(stdout), redirect_stderr(io.StringIO()):
+            self.assertEqual(daemon.run(list(argv)), 0)
+        return stdout.getvalue()
+
+    def test_run_reuses_parsed_files(self):
+        src = str(self.root / "a/m.py")
+        output = self.run_refac(
+            "file", src, str(self.root / "b/m.py"), "--dry-run", "-j", "4"
+        )
+        self.assertEqual(output.count("+from b.m import M"), 10)
+        self.assertGreaterEqual(len(codemod._parse_cache), 10)
+
+        # Another move of the same files parses none of them again.
+        with mock.patch.object(
+            codemod, "parse_module", wraps=codemod.parse_module
+        ) as parse_module:
+            output = self.run_refac(
+                "file", src, str(self.root / "c/m.py"), "--dry-run", "-j", "4"
+            )
+        self.assertEqual(output.count("+from c.m import M"), 10)
+        parse_module.assert_not_called()
@@ -0,0 +1,183 @@
+import os
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from refac import fs, memory, module_map as module_map_module, utils
+from refac.module_map import module_map
+from refac.move_file import move
+
+
+class FsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name).resolve()
+        (self.root / "a").mkdir()
+        (self.root / "a/b.py").write_text("import os\n")
+        (self.root / "a/c.py").write_text("x = 1")
+
+    def test_without_dry_run(self):
+        self.assertFalse(fs.is_buffered())
+        fs.write_text(self.root / "x/y.py", "y = 2\n")
+        self.assertEqual((self.root / "x/y.py").read_text(), "y = 2\n")
+        fs.delete(self.root / "a/b.py")
+        self.assertFalse((self.root / "a/b.py").exists())
+        self.assertEqual(list(fs.diff(self.root)), [])
+
+    def test_coding_cookie(self):
+        path = self.root / "a/latin1.py"
+        code = "# -*- coding: latin-1 -*-\ns = 'é'\n"
+        fs.write_text(path, code)
+        self.assertEqual(path.read_bytes(), code.encode("latin-1"))
+        self.assertEqual(fs.read_text(path), code)
+        self.assertEqual(fs.decode(code.encode("latin-1")), (code, "iso-8859-1"))
+
+        # Python only reads a cookie on the first two lines.
+        code = "s = 'é'\n\n# -*- coding: latin-1 -*-\n"
+        fs.write_text(path, code)
+        self.assertEqual(path.read_bytes(), code.encode())
+
+        fs.write_text(path, "s = 'é'\n", "utf-8-sig")
+        self.assertEqual(fs.decode(path.read_bytes()), ("s = 'é'\n", "utf-8-sig"))
+
+    def test_dry_run(self):
+        with fs.dry_run():
+            fs.write_text(self.root / "a/b.py", "import sys\n")
+            fs.write_text(self.root / "x/y.py", "y = 2\n")
+            fs.delete(self.root / "a/c.py")
+
+            self.assertEqual(fs.read_text(self.root / "a/b.py"), "import sys\n")
+            self.assertEqual(fs.buffered_bytes(self.root / "x/y.py"), b"y = 2\n")
+            self.assertIsNone(fs.buffered_bytes(self.root / "a/c.py"))
+            with self.assertRaises(FileNotFoundError):
+                fs.read_text(self.root / "a/c.py")
+            self.assertTrue(fs.is_file(self.root / "x/y.py"))
+            self.assertTrue(fs.is_dir(self.root / "x"))
+            self.assertFalse(fs.exists(self.root / "a/c.py"))
+            self.assertEqual(
+                fs.list_files(self.root, ["a/b.py", "a/c.py", "README.md"], ".py"),
+                ["README.md", "a/b.py", "x/y.py"],
+            )
+        self.assertFalse(fs.is_buffered())
+        self.assertEqual((self.root / "a/b.py").read_text(), "import os\n")
+        self.assertTrue((self.root / "a/c.py").is_file())
+        self.assertFalse((self.root / "x").exists())
+
+    def test_move_tree(self):
+        with fs.dry_run():
+            fs.move_tree(self.root / "a", self.root / "z")
+            self.assertFalse(fs.is_dir(self.root / "a"))
+            self.assertEqual(
+                fs.files_under(self.root / "z"), [self.root / "z/b.py", self.root / "z/c.py"]
+            )
+        self.assertTrue((self.root / "a/b.py").is_file())
+
+    def test_transaction(self):
+        (self.root / "a/b.py").chmod(0o755)
+        os.utime(self.root / "a/c.py", (0, 0))
+        with fs.transaction():
+            fs.write_text(self.root / "a/b.py", "import sys\n")
+            fs.write_text(self.root / "a/c.py", "x = 1")
+            fs.write_text(self.root / "x/y.py", "y = 2\n")
+            self.assertEqual((self.root / "a/b.py").read_text(), "import os\n")
+        self.assertFalse(fs.is_buffered())
+        self.assertEqual((self.root / "a/b.py").read_text(), "import sys\n")
+        self.assertEqual((self.root / "a/b.py").stat().st_mode & 0o777, 0o755)
+        self.assertEqual((self.root / "x/y.py").read_text(), "y = 2\n")
+        # Unchanged files are not written.
+        self.assertEqual((self.root / "a/c.py").stat().st_mtime, 0)
+        self.assertEqual(
+            sorted(p.name for p in self.root.rglob("*")),
+            ["a", "b.py", "c.py", "x", "y.py"],
+        )
+
+    def test_transaction_error(self):
+        with self.assertRaises(ValueError):
+            with fs.transaction():
+                fs.write_text(self.root / "a/b.py", "import sys\n")
+                fs.delete(self.root / "a/c.py")
+                raise ValueError()
+        self.assertEqual((self.root / "a/b.py").read_text(), "import os\n")
+        self.assertTrue((self.root / "a/c.py").is_file())
+
+    def test_transaction_under_memory_limit(self):
+        with memory.limit(1 << 30), fs.transaction():
+            fs.write_text(self.root / "a/b.py", "import sys\n")
+            fs.write_text(self.root / "x/y.py", "y = 2\n")
+            changes = fs._changes
+            assert changes is not None and changes.spill_dir is not None
+            self.assertEqual(changes.files, {})
+            self.assertEqual(len(list(changes.spill_dir.iterdir())), 2)
+            self.assertEqual(fs.read_text(self.root / "a/b.py"), "import sys\n")
+            self.assertEqual((self.root / "a/b.py").read_text(), "import os\n")
+        self.assertEqual((self.root / "a/b.py").read_text(), "import sys\n")
+        self.assertEqual((self.root / "x/y.py").read_text(), "y = 2\n")
+        self.assertFalse(changes.spill_dir.exists())
+
+    def test_move_tree_commit(self):
+        (self.root / "a/d").mkdir()
+        fs.move_tree(self.root / "a", self.root / "z")
+        self.assertFalse((self.root / "a").exists())
+        self.assertEqual((self.root / "z/b.py").read_text(), "import os\n")
+
+    def test_diff(self):
+        with fs.dry_run():
+            fs.write_text(self.root / "a/b.py", "import sys\n")
+            fs.write_text(self.root / "a/c.py", "x = 1")
+            fs.write_bytes(self.root / "a/__init__.py", b"")
+            fs.delete(self.root / "a/c.py")
+            self.assertEqual(
+                "".join(fs.diff(self.root)),
+                "diff --git a/a/__init__.py b/a/__init__.py\n"
+                "new file mode 100644\n"
+                "diff --git a/a/b.py b/a/b.py\n"
+                "--- a/a/b.py\n"
+                "+++ b/a/b.py\n"
+                "@@ -1 +1 @@\n"
+                "-import os\n"
+                "+import sys\n"
+                "diff --git a/a/c.py b/a/c.py\n"
+                f"deleted file mode {(self.root / 'a/c.py').stat().st_mode:o}\n"
+                "--- a/a/c.py\n"
+                "+++ /dev/null\n"
+                "@@ -1 +0,0 @@\n"
+                "-x = 1\n"
+                "\\ No newline at end of file\n",
+            )
+
+
+class DryRunMoveTest(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name).resolve()
+        for module in (utils, module_map_module):
+            patcher = mock.patch.object(module, "ROOT_DIR", self.root)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(module_map.cache_clear)
+
+        subprocess.run(["git", "init"], cwd=self.root, check=True, capture_output=True)
+        (self.root / "a").mkdir()
+        (self.root / "a/__init__.py").touch()
+        (self.root / "a/b.py").write_text("B = 1\n")
+        module_map.cache_clear()
+
+    def test_move(self):
+        with fs.dry_run():
+            move(self.root / "a/b.py", self.root / "x/y.py")
+            self.assertTrue(module_map().exists("x.y"))
+            self.assertFalse(module_map().exists("a.b"))
+            self.assertEqual(
+                [file_diff.splitlines()[0] for file_diff in fs.diff(self.root)],
+                [
+                    "diff --git a/a/b.py b/a/b.py",
+                    "diff --git a/x/__init__.py b/x/__init__.py",
+                    "diff --git a/x/y.py b/x/y.py",
+                ],
+            )
+        self.assertEqual((self.root / "a/b.py").read_text(), "B = 1\n")
+        self.assertFalse((self.root / "x").exists())
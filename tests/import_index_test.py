@@ -0,0 +1,183 @@
+import os
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from refac import import_index, utils
+from refac.import_index import ImportIndex, ModuleSet, scan_imports
+
+
+class ScanImportsTest(unittest.TestCase):
+    def test_scan_imports(self):
+        root = Path("/repo")
+        for filename, source, expected in (
+            ("a/b.py", "import x.y", {"x.y"}),
+            ("a/b.py", "import x.y as z", {"x.y"}),
+            ("a/b.py", "from x.y import z, w as v", {"x.y.z", "x.y.w"}),
+            ("a/b.py", "from . import c", {"a.c"}),
+            ("a/b.py", "from .c import d", {"a.c.d"}),
+            ("a/b/__init__.py", "from . import c", {"a.b.c"}),
+            ("a/b/__init__.py", "from .. import c", {"a.c"}),
+            ("a/b.py", "from ... import c", set()),
+            ("a/b.py", "from x import *", set()),
+            ("a/b.py", "def f():\n    if True:\n        import x", {"x"}),
+            ("a/b.py", "try:\n    pass\nexcept Exception:\n    import x", {"x"}),
+            ("a/b.py", "s = 'import x'\n# import y", set()),
+            ("a/b.py", "def (:", {import_index.UNKNOWN}),
+            ("a/b.py", "# coding: latin-1\nimport x\n".encode() + b"s = '\xe9'", {"x"}),
+            ("a/b.py", b"import x\ns = '\xe9'", {import_index.UNKNOWN}),
+        ):
+            with mock.patch.object(import_index, "ROOT_DIR", root):
+                self.assertEqual(
+                    scan_imports(filename, source), expected, (filename, source)
+                )
+
+
+class ModuleSetTest(unittest.TestCase):
+    def test_matches(self):
+        modules = ModuleSet(["a.b", "x.y.z"])
+        for name, expected in (
+            ("a.b", True),
+            ("a.b.c", True),
+            ("a", True),
+            ("x.y", True),
+            ("a.bc", False),
+            ("a.c", False),
+            ("x.y.w", False),
+            ("os", False),
+            (import_index.UNKNOWN, True),
+        ):
+            self.assertEqual(modules.matches(name), expected, name)
+
+    def test_may_be_imported(self):
+        modules = ModuleSet(["a.b"])
+        for source, expected in (
+            ("from a import b", True),
+            ("from . import b", True),
+            ("def f():\n    import a.b.c", True),
+            ("from a import bc", False),
+            ("# a.b\ns = 'a.b'\nb = 1", False),
+            ("def (:", True),
+        ):
+            self.assertEqual(
+                modules.may_be_imported("a.x", "a/x.py", source), expected, source
+            )
+
+
+class ImportIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+        for module in (import_index, utils):
+            patcher = mock.patch.object(module, "ROOT_DIR", self.root)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def index(self, files: dict) -> ImportIndex:
+        index = ImportIndex(self.root / "index.pickle")
+        index.files = {
+            filename: ((0, 0), frozenset(names)) for filename, names in files.items()
+        }
+        return index
+
+    def test_files_importing(self):
+        index = self.index(
+            {
+                "exact.py": {"a.b"},
+                "child.py": {"a.b.c"},
+                "parent.py": {"a"},
+                "similar.py": {"a.bc"},
+                "sibling.py": {"a.x"},
+                "unrelated.py": {"os"},
+            }
+        )
+        self.assertEqual(
+            index.files_importing(["a.b"]),
+            [str(self.root / f) for f in ("child.py", "exact.py", "parent.py")],
+        )
+        self.assertEqual(
+            index.files_importing(["a.b.c.d", "a.x"]),
+            [str(self.root / f) for f in ("child.py", "exact.py", "parent.py", "sibling.py")],
+        )
+
+    def test_files_importing_unparseable(self):
+        (self.root / "py2.py").write_text("import a.b\nprint 'hello'\n")
+        (self.root / "latin1.py").write_bytes("import a.b\ns = 'é'\n".encode("latin-1"))
+        (self.root / "cookie.py").write_bytes(
+            "# -*- coding: latin-1 -*-\nimport a.b\ns = 'é'\n".encode("latin-1")
+        )
+        index = self.index(
+            {
+                "exact.py": {"a.b"},
+                "py2.py": import_index.scan_file("py2.py"),
+                "latin1.py": import_index.scan_file("latin1.py"),
+                "cookie.py": import_index.scan_file("cookie.py"),
+            }
+        )
+        self.assertEqual(index.files["cookie.py"][1], frozenset({"a.b"}))
+        self.assertEqual(
+            index.files_importing(["x.y"]),
+            [str(self.root / f) for f in ("latin1.py", "py2.py")],
+        )
+
+    def test_save_and_load(self):
+        index = self.index({"a.py": {"x.y"}})
+        index.save()
+        loaded = ImportIndex.load(index.path)
+        self.assertEqual(loaded.files, index.files)
+
+    def git(self, *args: str) -> None:
+        subprocess.run(
+            ["git", "-c", "user.name=refac", "-c", "user.email=refac@example.com", *args],
+            cwd=self.root,
+            check=True,
+            capture_output=True,
+        )
+
+    def test_refresh_only_scans_changed_files(self):
+        self.git("init")
+        (self.root / "a.py").write_text("import x")
+        (self.root / "b.py").write_text("import y")
+        (self.root / "c.txt").write_text("import z")
+        self.git("add", ".")
+        self.git("commit", "-m", "init")
+
+        index = ImportIndex(self.root / "index.pickle")
+        self.assertEqual(index.refresh(), 2)
+        self.assertEqual(index.refresh(), 0)
+
+        # Touching a file without changing its content doesn't require a re-scan.
+        os.utime(self.root / "a.py", (0, 0))
+        self.assertEqual(index.refresh(), 0)
+
+        (self.root / "b.py").write_text("import zz")
+        (self.root / "d.py").write_text("import w")
+        self.assertEqual(index.refresh(), 2)
+        self.assertEqual(index.files["b.py"][1], frozenset({"zz"}))
+        self.assertEqual(index.files["d.py"][1], frozenset({"w"}))
+        self.assertEqual(index.refresh(), 0)
+
+        (self.root / "a.py").unlink()
+        self.assertEqual(index.refresh(), 1)
+        self.assertEqual(set(index.files), {"b.py", "d.py"})
+
+    def test_refresh_in_parallel(self):
+        self.git("init")
+        (self.root / "a.py").write_text("import x")
+        (self.root / "b.py").write_text("import y")
+        index = ImportIndex(self.root / "index.pickle")
+
+        # A few files are scanned in-process, where a pool would take longer to start.
+        with mock.patch.object(import_index, "ProcessPoolExecutor") as executor:
+            self.assertEqual(index.refresh(jobs=4), 2)
+        executor.assert_not_called()
+
+        (self.root / "a.py").write_text("import xx")
+        (self.root / "b.py").write_text("import yy")
+        with mock.patch.object(import_index, "PARALLEL_MIN_FILES", 2):
+            self.assertEqual(index.refresh(jobs=4), 2)
+        self.assertEqual(index.files["a.py"][1], frozenset({"xx"}))
+        self.assertEqual(index.files["b.py"][1], frozenset({"yy"}))
@@ -0,0 +1,39 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from refac import memory
+
+
+class MemoryTest(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(memory.parse_size("1000"), 1000)
+        self.assertEqual(memory.parse_size("512M"), 512 << 20)
+        self.assertEqual(memory.parse_size("1.5g"), 3 << 29)
+        self.assertEqual(memory.parse_size("2GiB"), 2 << 30)
+        with self.assertRaises(ValueError):
+            memory.parse_size("lots")
+
+    def test_limit(self):
+        self.assertIsNone(memory.max_memory())
+        with memory.limit(100):
+            self.assertEqual(memory.max_memory(), 100)
+            self.assertTrue(memory.is_near_limit(95))
+            self.assertFalse(memory.is_near_limit(50))
+        self.assertIsNone(memory.max_memory())
+        self.assertFalse(memory.is_near_limit(10**12))
+
+    def test_limit_without_rss(self):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            with memory.limit(100):
+                pass
+            self.assertEqual(stderr.getvalue(), "")
+            with mock.patch.object(memory, "rss", return_value=0), memory.limit(100):
+                pass
+        self.assertIn("Cannot measure memory use", stderr.getvalue())
+
+    def test_rss(self):
+        self.assertGreater(memory.peak_rss(), 0)
+        self.assertGreater(memory.rss(), 0)
@@ -0,0 +1,81 @@
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from refac import utils
+from refac.module_map import ModuleMap, module_map
+
+FILENAMES = [
+    "a/__init__.py",
+    "a/b.py",
+    "a/c/__init__.py",
+    "a/c/d.py",
+    "ns/e.py",
+    "README.md",
+]
+
+
+class ModuleMapTest(unittest.TestCase):
+    def test_to_filename(self):
+        modules = ModuleMap(FILENAMES)
+        for module, expected, exists in (
+            ("a", "a/__init__.py", True),
+            ("a.b", "a/b.py", True),
+            ("a.c", "a/c/__init__.py", True),
+            ("a.c.d", "a/c/d.py", True),
+            ("ns", "ns/__init__.py", False),
+            ("ns.e", "ns/e.py", True),
+            ("x.y", "x/y.py", False),
+        ):
+            self.assertEqual(modules.to_filename(module), expected, module)
+            self.assertEqual(modules.exists(module), exists, module)
+
+    def test_to_module(self):
+        for filename, expected in (
+            ("a/b.py", "a.b"),
+            ("a/c/__init__.py", "a.c"),
+            ("a/c", "a.c"),
+            ("a/happy.py", "a.happy"),
+            ("a.py", "a"),
+        ):
+            self.assertEqual(ModuleMap.to_module(filename), expected, filename)
+
+
+class UtilsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name).resolve()
+        patcher = mock.patch.object(utils, "ROOT_DIR", self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(module_map.cache_clear)
+
+        subprocess.run(["git", "init"], cwd=self.root, check=True, capture_output=True)
+        for filename in FILENAMES:
+            (self.root / filename).parent.mkdir(parents=True, exist_ok=True)
+            (self.root / filename).touch()
+        module_map.cache_clear()
+
+    def test_to_module(self):
+        for filename, expected in (
+            ("a/b.py", "a.b"),
+            ("a/c/__init__.py", "a.c"),
+            ("a/c", "a.c"),
+            ("a/happy.py", "a.happy"),
+        ):
+            self.assertEqual(utils.to_module(self.root / filename), expected, filename)
+
+    def test_to_file(self):
+        self.assertEqual(utils.to_file("a.c"), self.root / "a/c/__init__.py")
+        self.assertEqual(utils.to_file("a.b"), self.root / "a/b.py")
+        with self.assertRaises(FileNotFoundError):
+            utils.to_file("x.y", should_already_exist=True)
+
+    def test_to_file_should_create(self):
+        path = utils.to_file("x.y", should_create=True)
+        self.assertEqual(path, self.root / "x/y.py")
+        self.assertTrue((self.root / "x/__init__.py").is_file())
+        self.assertTrue(module_map().exists("x.y"))
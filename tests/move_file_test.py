@@ -0,0 +1,91 @@
+from refac.move_file import move_file, validate_all
+from tests.temp_repo import TempRepoTest
+
+
+class MoveFileTest(TempRepoTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.write(
+            {
+                "a/__init__.py": "",
+                "a/b.py": "B = 1\n",
+                "a/c/__init__.py": "",
+                "a/c/d.py": "D = 2\n",
+                "a/c/e.py": """\
+                    from a.c.d import D
+                    from .d import D as D2
+                """,
+                "main.py": """\
+                    from a.b import B
+                    from a.c.d import D
+                    import a.c.d
+
+                    print(B, D, a.c.d.D)
+                """,
+            }
+        )
+
+    def test_move_file_and_directory(self):
+        move_file(
+            [str(self.root / "a/b.py"), str(self.root / "a/c")],
+            [str(self.root / "x/y.py"), str(self.root / "x/z")],
+        )
+        self.assertFiles(
+            {
+                "a/b.py": None,
+                "a/c": None,
+                "x/__init__.py": "",
+                # Moving to a new file appends to the empty file made for it.
+                "x/y.py": "\nB = 1\n",
+                "x/z/__init__.py": "",
+                "x/z/d.py": "D = 2\n",
+                "x/z/e.py": """\
+                    from x.z.d import D
+                    from .d import D as D2
+                """,
+                "main.py": """\
+                    from x.y import B
+                    from x.z.d import D
+                    import x.z.d
+
+                    print(B, D, x.z.d.D)
+                """,
+            }
+        )
+
+    def test_move_directory_into_existing_directory(self):
+        self.write({"x/__init__.py": "", "x/z/__init__.py": "", "x/z/w.py": "W = 3\n"})
+        move_file([str(self.root / "a/c")], [str(self.root / "x/z")])
+        self.assertFiles(
+            {
+                "a/c": None,
+                "x/z/w.py": "W = 3\n",
+                "x/z/d.py": "D = 2\n",
+                "x/z/e.py": """\
+                    from x.z.d import D
+                    from .d import D as D2
+                """,
+            }
+        )
+
+    def test_validate_all(self):
+        for olds, news, message in (
+            (["a/b.py"], ["x/y.py", "x/z.py"], "same number"),
+            (["a/c", "a/c/d.py"], ["x", "x/d.py"], "inside it"),
+            (["a/c/d.py", "a/c"], ["x/d.py", "x"], "inside it"),
+            (["a/b.py", "a/b.py"], ["x/y.py", "x/z.py"], "more than once"),
+            (["a/b.py", "a/../a/b.py"], ["x/y.py", "x/z.py"], "more than once"),
+            (["a/b.py"], ["a/c"], "to a directory"),
+            (["a/c"], ["a/b.py"], "to a file"),
+        ):
+            with self.subTest(olds=olds, news=news):
+                with self.assertRaisesRegex(Exception, message):
+                    validate_all(
+                        [self.root / old for old in olds],
+                        [self.root / new for new in news],
+                    )
+        validate_all(
+            [self.root / "a/b.py", self.root / "a/c"],
+            [self.root / "x/y.py", self.root / "x/z"],
+        )
+        self.assertFalse((self.root / "x").exists())
@@ -0,0 +1,124 @@
+import json
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from refac.move_plan import Move, apply, compose, load
+from tests.temp_repo import TempRepoTest
+
+
+class ComposeTest(unittest.TestCase):
+    def test_compose(self):
+        for pairs, expected in (
+            ([("a.b", "x.y")], [("a.b", "x.y")]),
+            ([("a.b", "x.y"), ("c.d", "z.w")], [("a.b", "x.y"), ("c.d", "z.w")]),
+            ([("a.b", "x.y"), ("x.y", "q.r")], [("a.b", "q.r"), ("x.y", "q.r")]),
+            ([("a.b", "x.y"), ("x.y", "a.b")], [("x.y", "a.b")]),
+            (
+                [("a.b", "x.y"), ("x.y.Foo", "z.Foo")],
+                [("a.b.Foo", "z.Foo"), ("x.y.Foo", "z.Foo"), ("a.b", "x.y")],
+            ),
+            (
+                [("a.b.Foo", "x.y.Foo"), ("x.y", "q.r")],
+                [("a.b.Foo", "q.r.Foo"), ("x.y", "q.r")],
+            ),
+            ([("a.b", "x.y"), ("x.yz", "q.r")], [("a.b", "x.y"), ("x.yz", "q.r")]),
+        ):
+            self.assertEqual(compose(pairs), expected, pairs)
+
+    def test_compose_filenames(self):
+        self.assertEqual(
+            compose([("a/b.py", "x/y.py"), ("x/y.py", "z.py")], sep="/"),
+            [("a/b.py", "z.py"), ("x/y.py", "z.py")],
+        )
+
+
+class LoadTest(unittest.TestCase):
+    def test_load_json(self):
+        with TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "plan.json"
+            path.write_text(
+                json.dumps(
+                    [
+                        {"type": "file", "src": "a.py,b.py", "dst": "x.py,y.py"},
+                        {"type": "symbol", "src": ["a.Foo"], "dst": ["x.Foo"]},
+                    ]
+                )
+            )
+            self.assertEqual(
+                load(path),
+                [
+                    Move("file", ["a.py", "b.py"], ["x.py", "y.py"]),
+                    Move("symbol", ["a.Foo"], ["x.Foo"]),
+                ],
+            )
+
+    def test_load_invalid(self):
+        with TemporaryDirectory() as temp_dir:
+            path = Path(temp_dir) / "plan.json"
+            for plan in (
+                {"type": "file"},
+                [{"type": "rename", "src": "a", "dst": "b"}],
+                [{"type": "file", "src": "a.py,b.py", "dst": "x.py"}],
+            ):
+                path.write_text(json.dumps(plan))
+                with self.assertRaises(Exception):
+                    load(path)
+
+
+class ApplyTest(TempRepoTest):
+    def test_apply(self):
+        self.write(
+            {
+                "a/__init__.py": "",
+                "a/b.py": """\
+                    class Foo:
+                        pass
+
+
+                    def make():
+                        return Foo()
+                """,
+                "old/__init__.py": "",
+                "old/lib.py": "X = 1\n",
+                "main.py": """\
+                    from a.b import Foo, make
+                    from old.lib import X
+
+                    print(Foo, make, X, "a/b.py")
+                """,
+            }
+        )
+        apply(
+            [
+                Move("file", [str(self.root / "a/b.py")], [str(self.root / "x/y.py")]),
+                # Foo is renamed twice, a.b.Foo -> x.y.Foo -> x.q.Foo, which is
+                # composed into a single rename of the imports.
+                Move("symbol", ["x.y.Foo"], ["x.q.Foo"]),
+                Move("import", ["old.lib"], ["new.lib"]),
+            ],
+            jobs=1,
+        )
+        self.assertFiles(
+            {
+                "a/b.py": None,
+                "x/__init__.py": "",
+                "x/y.py": """\
+
+                    from x.q import Foo
+
+
+                    def make():
+                        return Foo()
+                """,
+                # The new module was empty, without a trailing newline.
+                "x/q.py": "class Foo:\n    pass",
+                "old/lib.py": "X = 1\n",
+                "main.py": """\
+                    from x.q import Foo; from x.y import make
+                    from new.lib import X
+
+                    print(Foo, make, X, "x/y.py")
+                """,
+            }
+        )
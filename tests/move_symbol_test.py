@@ -0,0 +1,98 @@
+from unittest import mock
+
+from refac import fs
+from refac.move_symbol import move_symbol
+from tests.temp_repo import TempRepoTest
+
+
+class MoveSymbolTest(TempRepoTest):
+    def test_move_symbol(self):
+        self.write(
+            {
+                "a/__init__.py": "",
+                "a/b.py": """\
+                    import os
+
+
+                    def _path():
+                        return os.getcwd()
+
+
+                    def foo():
+                        return _path()
+
+
+                    class Bar:
+                        pass
+
+
+                    def baz():
+                        return foo(), Bar()
+                """,
+                "x/__init__.py": "",
+                "x/y.py": "Y = 1\n",
+                "main.py": """\
+                    from a.b import Bar, baz, foo
+
+                    print(Bar, baz, foo)
+                """,
+            }
+        )
+        with mock.patch.object(fs, "write_text", wraps=fs.write_text) as write_text:
+            move_symbol(["a.b.foo", "a.b.Bar"], ["x.y.foo", "x.y.Bar"])
+        written = [call.args[0] for call in write_text.call_args_list]
+        self.assertEqual(written.count(self.root / "a/b.py"), 1)
+
+        self.assertFiles(
+            {
+                # baz still uses the moved symbols, so they are imported back.
+                "a/b.py": """\
+                    from x.y import Bar, foo
+
+
+                    def baz():
+                        return foo(), Bar()
+                """,
+                # _path is only used by foo, so it moves along, with its import.
+                "x/y.py": """\
+                    import os
+
+                    Y = 1
+
+
+                    def _path():
+                        return os.getcwd()
+
+
+                    def foo():
+                        return _path()
+
+
+                    class Bar:
+                        pass
+                """,
+                "main.py": """\
+                    from a.b import baz; from x.y import Bar; from x.y import foo
+
+                    print(Bar, baz, foo)
+                """,
+            }
+        )
+
+    def test_move_symbol_with_coding_cookie(self):
+        self.write({"a/__init__.py": "", "x/__init__.py": "", "x/y.py": ""})
+        (self.root / "a/b.py").write_bytes(
+            "# -*- coding: latin-1 -*-\ndef foo():\n    return 'é'\n\n\nS = 'è'\n".encode(
+                "latin-1"
+            )
+        )
+        move_symbol(["a.b.foo"], ["x.y.foo"])
+        self.assertEqual(
+            (self.root / "a/b.py").read_bytes(),
+            "# -*- coding: latin-1 -*-\nfrom x.y import foo\n\n\nS = 'è'\n".encode(
+                "latin-1"
+            ),
+        )
+        self.assertEqual(
+            (self.root / "x/y.py").read_bytes(), "def foo():\n    return 'é'".encode()
+        )
@@ -0,0 +1,57 @@
+import re
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from refac import replace_str, utils
+from refac.replace_str import find_and_replace_all, trie_regex
+
+
+class TrieRegexTest(unittest.TestCase):
+    def test_trie_regex(self):
+        self.assertEqual(trie_regex(["ab", "abc", "ad"]), "a(?:b(?:c)?|d)")
+        self.assertEqual(trie_regex(["a.b"]), "a\\.b")
+
+    def test_matches_longest(self):
+        words = ["a.b", "a.b.c", "a.bc", "x/y.py"]
+        pattern = re.compile(trie_regex(words))
+        self.assertEqual(
+            pattern.findall("a.b a.b.c a.bc a.bd x/y.py x/y"),
+            ["a.b", "a.b.c", "a.bc", "a.b", "x/y.py"],
+        )
+
+
+class FindAndReplaceAllTest(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name)
+        for module in (replace_str, utils):
+            patcher = mock.patch.object(module, "ROOT_DIR", self.root)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        subprocess.run(["git", "init"], cwd=self.root, check=True, capture_output=True)
+
+    def test_find_and_replace_all(self):
+        (self.root / "a.py").write_text('s = "a/b.py a.b a.b.c a.bc"\n')
+        (self.root / "b.md").write_text("Nothing to see here.\n")
+        (self.root / "c.bin").write_bytes(b"a.b\0")
+        (self.root / ".gitignore").write_text("ignored.txt\n")
+        (self.root / "ignored.txt").write_text("a.b\n")
+
+        changed = find_and_replace_all(
+            [("a/b.py", "x/y.py"), ("a.b", "x.y"), ("a.b.c", "q.r")]
+        )
+        self.assertEqual(changed, ["a.py"])
+        self.assertEqual(
+            (self.root / "a.py").read_text(), 's = "x/y.py x.y q.r x.yc"\n'
+        )
+        self.assertEqual((self.root / "c.bin").read_bytes(), b"a.b\0")
+        self.assertEqual((self.root / "ignored.txt").read_text(), "a.b\n")
+
+    def test_noop(self):
+        (self.root / "a.py").write_text("a.b\n")
+        self.assertEqual(find_and_replace_all([("a.b", "a.b")]), [])
+        self.assertEqual(find_and_replace_all([]), [])
@@ -0,0 +1,66 @@
+import os
+import types
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from refac.result_cache import ResultCache, disk_usage, pairs_key
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.cache = ResultCache(Path(temp_dir.name), max_bytes=5)
+
+    def test_pairs_key(self):
+        self.assertEqual(pairs_key([" a.b", "c"], ["x.y ", "c"]), '[["a.b","x.y"]]')
+
+    def test_key(self):
+        key = self.cache.key("[]", "a.b", "a", "import c")
+        self.assertEqual(key, self.cache.key("[]", "a.b", "a", "import c"))
+        self.assertNotEqual(key, self.cache.key("[]", "a.b", "a", "import d"))
+        self.assertNotEqual(key, self.cache.key("[]", "a.c", "a", "import c"))
+        self.assertNotEqual(key, self.cache.key("[]", "a.b", "a.b", "import c"))
+        self.assertNotEqual(key, self.cache.key('[["a","b"]]', "a.b", "a", "import c"))
+
+    def test_get_and_set(self):
+        self.assertIsNone(self.cache.get("1234"))
+        self.cache.set("1234", False, None)
+        self.assertEqual(self.cache.get("1234"), (False, None))
+        self.cache.set("5678", True, "import x\n")
+        self.assertEqual(self.cache.get("5678"), (True, "import x\n"))
+
+    def test_disk_usage(self):
+        # A 1 byte entry still takes a whole block.
+        self.assertEqual(disk_usage(types.SimpleNamespace(st_size=1, st_blocks=8)), 4096)
+        self.assertEqual(disk_usage(types.SimpleNamespace(st_size=1)), 1)
+
+    def test_prune_evicts_least_recently_used(self):
+        added = 0
+        for i, key in enumerate(("aa01", "aa02", "aa03")):
+            added += self.cache.set(key, True, "1234")
+            os.utime(self.cache.entry(key), ns=(i, i))
+        self.cache.get("aa01")
+        # Room for a bit more than one entry.
+        self.cache.max_bytes = added // 2
+
+        self.assertEqual(self.cache.prune(added), 2)
+        self.assertEqual(self.cache.size_path.read_text(), str(added // 3))
+        self.assertIsNotNone(self.cache.get("aa01"))
+        self.assertIsNone(self.cache.get("aa02"))
+        self.assertIsNone(self.cache.get("aa03"))
+
+    def test_prune_keeps_a_running_size(self):
+        self.cache.max_bytes = 1 << 20
+        added = self.cache.set("aa01", False, None)
+        self.assertEqual(self.cache.prune(added), 0)
+        self.assertEqual(self.cache.size_path.read_text(), str(added))
+
+        # Under the limit, the entries are not scanned again.
+        added = self.cache.set("aa02", False, None)
+        with mock.patch.object(Path, "glob") as glob:
+            self.assertEqual(self.cache.prune(added), 0)
+        glob.assert_not_called()
+        self.assertEqual(self.cache.size_path.read_text(), str(2 * added))
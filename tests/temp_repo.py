@@ -0,0 +1,70 @@
+import subprocess
+import unittest
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from textwrap import dedent
+from typing import Dict, Optional
+from unittest import mock
+
+from refac import (
+    codemod,
+    import_index,
+    module_map as module_map_module,
+    move_file,
+    move_plan,
+    move_symbol,
+    replace_str,
+    result_cache,
+    utils,
+)
+from refac.import_index import loaded_index
+from refac.module_map import module_map
+
+
+class TempRepoTest(unittest.TestCase):
+    """Runs each test in a new git repo, with $ROOT_DIR and the caches inside it."""
+
+    def setUp(self) -> None:
+        temp_dir = TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.root = Path(temp_dir.name).resolve()
+        for module in (
+            codemod,
+            import_index,
+            module_map_module,
+            move_file,
+            move_plan,
+            move_symbol,
+            replace_str,
+            utils,
+        ):
+            patcher = mock.patch.object(module, "ROOT_DIR", self.root)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for module in (import_index, result_cache):
+            patcher = mock.patch.object(module, "CACHE_DIR", self.root / ".cache")
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(module_map.cache_clear)
+        self.addCleanup(loaded_index.cache_clear)
+        module_map.cache_clear()
+        loaded_index.cache_clear()
+
+        subprocess.run(["git", "init"], cwd=self.root, check=True, capture_output=True)
+        (self.root / ".gitignore").write_text(".cache/\n")
+
+    def write(self, files: Dict[str, str]) -> None:
+        for filename, code in files.items():
+            path = self.root / filename
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(dedent(code))
+        module_map.cache_clear()
+
+    def assertFiles(self, files: Dict[str, Optional[str]]) -> None:
+        """Assert the content of `files`, where None means the file does not exist."""
+        for filename, code in files.items():
+            path = self.root / filename
+            if code is None:
+                self.assertFalse(path.exists(), filename)
+            else:
+                self.assertEqual(path.read_text(), dedent(code), filename)
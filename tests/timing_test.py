@@ -0,0 +1,96 @@
+import os
+import unittest
+
+from refac import timing
+
+
+class TimingTest(unittest.TestCase):
+    def test_phase(self):
+        with timing.phase("codemod"):
+            pass
+        with timing.recording() as profile:
+            with timing.phase("codemod"):
+                pass
+            with timing.phase("codemod"):
+                pass
+            with timing.recording() as inner:
+                with timing.phase("strings"):
+                    pass
+        self.assertEqual(list(profile.phases), ["codemod"])
+        self.assertGreaterEqual(profile.phases["codemod"], 0)
+        self.assertEqual(list(inner.phases), ["strings"])
+
+    def test_decorator(self):
+        @timing.phase("move")
+        def move():
+            return 1
+
+        with timing.recording() as profile:
+            self.assertEqual(move(), 1)
+            self.assertEqual(move(), 1)
+        self.assertEqual(list(profile.phases), ["move"])
+
+    def test_report(self):
+        timing.add_file("a.py", [("parse", 0.0, 1.0)], 1)
+        with timing.recording() as profile:
+            timing.add_file("a.py", [("parse", 0.0, 0.5), ("transform", 0.5, 1.5)], 1)
+            timing.add_file("b.py", [("parse", 0.0, 2.0)], 2)
+            timing.add_file("c.py", [("parse", 0.0, 0.1)], 2)
+            profile.phases["codemod"] = 3.6
+        self.assertEqual(
+            [filename for filename, _ in profile.slowest_files(2)], ["b.py", "a.py"]
+        )
+        self.assertEqual(
+            profile.report(2),
+            "Time per phase:\n"
+            "  codemod       3.600s\n"
+            "Slowest 2 of 3 codemodded files:\n"
+            "     2.000s  b.py  (parse 2.000s)\n"
+            "     1.500s  a.py  (parse 0.500s, transform 1.000s)\n",
+        )
+
+    def test_memory(self):
+        with timing.recording() as profile:
+            timing.add_memory(1, 200 << 20)
+            timing.add_memory(1, 100 << 20)
+            timing.add_memory(os.getpid(), 50 << 20)
+        self.assertEqual(profile.memory, {1: 200 << 20, os.getpid(): 50 << 20})
+        self.assertEqual(
+            profile.report(1),
+            "Time per phase:\n"
+            "Peak memory per process:\n"
+            "  refac             50.0 MB\n"
+            "  worker 1         200.0 MB\n",
+        )
+
+    def test_trace(self):
+        with timing.recording() as profile:
+            with timing.phase("move"):
+                with timing.step("remove symbols"):
+                    pass
+            timing.add_file("a.py", [("parse", 1.0, 1.5), ("transform", 1.5, 2.0)], 123)
+        self.assertEqual(list(profile.phases), ["move"])
+        trace = profile.to_trace()
+        events = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual(
+            [(e["name"], e["cat"]) for e in events],
+            [
+                ("remove symbols", "step"),
+                ("move", "phase"),
+                ("a.py", "file"),
+                ("parse", "step"),
+                ("transform", "step"),
+            ],
+        )
+        file_event = events[2]
+        self.assertEqual((file_event["pid"], file_event["tid"]), (123, 123))
+        self.assertAlmostEqual(file_event["dur"], 1e6)
+        self.assertIn(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": 123,
+                "args": {"name": "refac worker 123"},
+            },
+            trace["traceEvents"],
+        )
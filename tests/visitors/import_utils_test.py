@@ -1,6 +1,10 @@
+import copy
+import pickle
+import sys
 import unittest
+from unittest import mock
 
-from libcst import parse_statement
+from libcst import parse_module, parse_statement
 from libcst.codemod import CodemodContext
 
 from refac.visitors import import_utils
@@ -23,3 +27,86 @@ class ImportUtilsTest(unittest.TestCase):
             )
             module = import_utils.get_absolute_module_for_import(context, node)
             self.assertEqual(module, expected_module)
+
+
+class ImportTableTest(unittest.TestCase):
+    def test_build(self):
+        context = CodemodContext(filename="a/b.py", full_module_name="a.b")
+        module = parse_module(
+            "import os.path\n"
+            "from . import c as d, e\n"
+            "def f():\n"
+            "    from x import *\n"
+            "    import e\n"
+        )
+        table = import_utils.ImportTable.build(context, module)
+        self.assertIs(import_utils.ImportTable.get(context), table)
+        self.assertEqual(
+            {key: [im.name for im in imports] for key, imports in table.by_key.items()},
+            {"os": ["os.path"], "d": ["a.c"], "e": ["a.e", "e"]},
+        )
+
+    def test_imports_are_created_once_per_node(self):
+        context = CodemodContext(filename="a/b.py", full_module_name="a.b")
+        table = import_utils.ImportTable.get(context)
+        node = parse_statement("from . import c").body[0]
+        with mock.patch.object(
+            import_utils.Import,
+            "bulk_create",
+            wraps=import_utils.Import.bulk_create,
+        ) as bulk_create:
+            self.assertIs(table.imports(node), table.imports(node))
+        self.assertEqual(bulk_create.call_count, 1)
+
+
+class DottedNameNodeTest(unittest.TestCase):
+    def test_dotted_name_node(self):
+        for name in ("a", "a.b", "a.b.c"):
+            node = import_utils.dotted_name_node(name)
+            self.assertEqual(parse_module("").code_for_node(node), name)
+            self.assertIs(import_utils.dotted_name_node(name), node)
+
+    def test_to_libcst_node(self):
+        context = CodemodContext(filename="a.py")
+        for im, expected in (
+            (import_utils.Import("a.b"), "import a.b"),
+            (import_utils.Import("a.b", None, "c"), "import a.b as c"),
+            (import_utils.Import("a.b", "c"), "from a.b import c"),
+            (import_utils.Import("a", "b", "c"), "from a import b as c"),
+        ):
+            node = im.to_libcst_node(context)
+            self.assertEqual(parse_module("").code_for_node(node), expected)
+
+
+class ImportTest(unittest.TestCase):
+    def test_attributes(self):
+        for im, name, parts, key in (
+            (import_utils.Import("a.b"), "a.b", ("a", "b"), "a.b"),
+            (import_utils.Import("a.b", None, "c"), "a.b", ("a", "b"), "c"),
+            (import_utils.Import("a", "b"), "a.b", ("a", "b"), "b"),
+            (import_utils.Import("a", "b", "c"), "a.b", ("a", "b"), "c"),
+        ):
+            self.assertEqual((im.name, im.parts, im.key), (name, parts, key), im)
+
+    def test_eq_and_hash(self):
+        Import = import_utils.Import
+        self.assertEqual(Import("a", "b"), Import("a", "b"))
+        self.assertEqual(hash(Import("a", "b")), hash(Import("a", "b")))
+        self.assertNotEqual(Import("a", "b"), Import("a.b"))
+        self.assertNotEqual(Import("a", "b"), Import("a", "b", "c"))
+        self.assertEqual(len({Import("a", "b"), Import("a", "b"), Import("a.b")}), 2)
+
+    def test_immutable(self):
+        im = import_utils.Import("a", "b", "c")
+        with self.assertRaises(AttributeError):
+            im.obj = "d"  # type: ignore[misc]
+        with self.assertRaises(AttributeError):
+            del im.asname
+        self.assertEqual(copy.copy(im), im)
+        self.assertEqual(pickle.loads(pickle.dumps(im)), im)
+
+    def test_interned(self):
+        im = import_utils.Import("".join(["a", ".b"]), "".join(["c", "d"]))
+        self.assertIs(im.parts[0], sys.intern("a"))
+        self.assertIs(im.parts[-1], sys.intern("cd"))
+        self.assertIs(im.key, sys.intern("cd"))
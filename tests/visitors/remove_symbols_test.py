@@ -134,6 +134,58 @@ class TestRemoveSymbolsVisitor(CodemodTest):
                 {ImportItem("f.k.j"), ImportItem("g", None, "h"), ImportItem("m")},
             )
 
+    def test_remove_constant_with_imports(self):
+        before = """
+            import m
+            from a.b import c
+
+            X = m.f(c)
+            Y = X
+        """
+        after = """
+            Y = X
+        """
+        with test_context() as context:
+            self.assertCodemod(before, after, {"X"}, context_override=context)
+            self.assertEqual(
+                context.scratch[self.TRANSFORM.CONTEXT_KEY]["imports"],
+                {ImportItem("m"), ImportItem("a.b", "c")},
+            )
+
+    def test_move_dependencies(self):
+        before = """
+            import m
+
+            def _helper():
+                return m
+
+            def _shared():
+                pass
+
+            def foo():
+                return _helper(), _shared()
+
+            def bar():
+                return _shared()
+        """
+        after = """
+            def _shared():
+                pass
+
+            def bar():
+                return _shared()
+        """
+        with test_context() as context:
+            self.assertCodemod(before, after, {"foo"}, True, context_override=context)
+            scratch = context.scratch[self.TRANSFORM.CONTEXT_KEY]
+            self.assertEqual(scratch["dependencies"], {"_helper"})
+            self.assertEqual(
+                [node.name.value for node in scratch["nodes"]], ["_helper", "foo"]
+            )
+            self.assertEqual(
+                scratch["imports"], {ImportItem("m"), ImportItem("a.b", "_shared")}
+            )
+
     def test_remove_import_symbol(self):
         before = """
             import c
@@ -1,8 +1,14 @@
+import unittest
+from unittest import mock
 from typing import Any
 
+from libcst import parse_module, parse_statement
 from libcst.codemod import CodemodContext, CodemodTest
+from libcst.metadata import ScopeProvider
 
-from refac.visitors.replace_import import ReplaceImportCodemod
+from refac.visitors.import_utils import Import
+from refac.visitors.inplace_replace_import import InplaceReplaceImportVisitor
+from refac.visitors.replace_import import Pair, PairTrie, ReplaceImportCodemod
 
 
 class ReplaceImportCodemodTest(CodemodTest):
@@ -832,3 +838,161 @@ class TestPlayground(ReplaceImportCodemodTest):
             new="x.y.z.c",
             format="from x.y import z as b",
         )
+
+
+class TestManyPairs(ReplaceImportCodemodTest):
+    TRANSFORM = ReplaceImportCodemod
+
+    def test_first_matching_pair_wins(self):
+        before = """
+            from a.b import c
+            c
+        """
+        after = """
+            from x import c
+            c
+        """
+
+        self.assertCodemod(before, after, old="q.r,a.b,a.b.c", new="q.s,x,y.z")
+
+    def test_many_pairs(self):
+        before = """
+            from a.b import c
+            import d.e
+            c.f
+            d.e.g
+        """
+        after = """
+            from x.b1999 import c
+            import y.e
+            c.f
+            y.e.g
+        """
+
+        olds = [f"m{i}.n" for i in range(5000)] + ["a.b", "d"]
+        news = [f"m{i}.o" for i in range(5000)] + ["x.b1999", "y"]
+        self.assertCodemod(before, after, old=",".join(olds), new=",".join(news))
+
+
+class TestPairTrie(unittest.TestCase):
+    def test_find(self):
+        context = CodemodContext(filename="a.py")
+        pairs = [
+            Pair(context, Import(old), Import("x"), None)
+            for old in ("a.b.c", "a.b", "a.b", "q")
+        ]
+        trie = PairTrie(pairs)
+        for qname, expected in (
+            ("a.b.c", 0),
+            ("a.b.c.d", 0),
+            ("a.b", 1),
+            ("a.b.d", 1),
+            ("a.bc", None),
+            ("a", None),
+            ("q.r", 3),
+            ("r", None),
+        ):
+            self.assertEqual(trie.find_index(qname), expected, qname)
+
+    def test_may_match(self):
+        context = CodemodContext(filename="a.py")
+        trie = PairTrie([Pair(context, Import("a.b.c"), Import("x"), None)])
+        for name, expected in (
+            ("a", True),
+            ("a.b", True),
+            ("a.b.c", True),
+            ("a.b.c.d", True),
+            ("a.x", False),
+            ("b", False),
+        ):
+            self.assertEqual(trie.may_match(name), expected, name)
+
+
+class TestCandidateKeys(ReplaceImportCodemodTest):
+    TRANSFORM = ReplaceImportCodemod
+
+    def test_candidate_keys(self):
+        codemod = ReplaceImportCodemod(
+            CodemodContext(filename="a.py"), "a.b.c", "x.y", None
+        )
+        module = parse_module(
+            "import os\n"
+            "import a\n"
+            "from a.b import c as d, e\n"
+            "def f():\n"
+            "    import a.b.c.g as h\n"
+        )
+        self.assertEqual(codemod.collect_candidate_keys(module), {"a", "d", "h"})
+
+    def test_unrelated_names_are_kept(self):
+        before = """
+            import os
+            from a.b import c
+            os.path
+            c.d
+        """
+        after = """
+            import os
+            from x import y
+            os.path
+            y.d
+        """
+
+        self.assertCodemod(before, after, old="a.b.c", new="x.y")
+
+    def test_no_matching_imports(self):
+        before = """
+            import os
+            c = 1
+            os.path
+        """
+
+        self.assertCodemod(before, before, old="a.b.c", new="x.y")
+
+
+class TestSinglePass(ReplaceImportCodemodTest):
+    TRANSFORM = ReplaceImportCodemod
+
+    def test_imports_are_replaced_without_another_traversal(self):
+        before = """
+            from a.b import c
+            def f():
+                return c.d
+        """
+        after = """
+            from x import y
+            def f():
+                return y.d
+        """
+
+        with mock.patch.object(
+            InplaceReplaceImportVisitor, "transform_module"
+        ) as transform_module:
+            self.assertCodemod(before, after, old="a.b.c", new="x.y")
+        transform_module.assert_not_called()
+
+    def test_import_without_scope_is_kept(self):
+        transformer = ReplaceImportCodemod(
+            CodemodContext(filename="a.py"), "a.b", "x.y", None
+        )
+        transformer.metadata = {ScopeProvider: {}}
+        node = parse_statement("import a.b").body[0]
+        self.assertFalse(transformer.is_unused(node, Import("a.b")))
+
+    def test_new_usage_still_refers_to_old_import(self):
+        before = """
+            import q
+            import x
+            import a.b
+            a.b
+            x.y
+        """
+        after = """
+            import q
+            import x; import r
+            import x.y.w.b
+            x.y.w.b
+            r
+        """
+
+        self.assertCodemod(before, after, old="x.y,a", new="r,x.y.w")
@@ -0,0 +1,78 @@
+import unittest
+from textwrap import dedent
+
+import libcst as cst
+from libcst.metadata import MetadataWrapper, ScopeProvider
+
+from refac.visitors.symbol_graph import SymbolGraph
+
+
+def graph(code: str) -> SymbolGraph:
+    wrapper = MetadataWrapper(cst.parse_module(dedent(code)))
+    return SymbolGraph(wrapper.module, wrapper.resolve(ScopeProvider))
+
+
+class SymbolGraphTest(unittest.TestCase):
+    def test_uses(self):
+        g = graph(
+            """
+            import os
+            from a import b as c
+
+            X = 1
+
+            def f():
+                return os.sep, c, X
+
+            class C:
+                y = f()
+            """
+        )
+        self.assertEqual(g.names, [set(), set(), {"X"}, {"f"}, {"C"}])
+        self.assertEqual(
+            [set(uses) for uses in g.uses], [set(), set(), set(), {"os", "c", "X"}, {"f"}]
+        )
+        self.assertEqual(g.definitions, {"X": 2, "f": 3, "C": 4})
+
+    def test_dependencies(self):
+        g = graph(
+            """
+            def _a(): pass
+            def _b(): return _a()
+            def _shared(): pass
+            def Public(): pass
+            def _behind_public(): pass
+            def Public2(): return _behind_public()
+            def f(): return _b(), _shared(), Public2()
+            def g(): return _shared()
+            """
+        )
+        self.assertEqual(g.dependencies({"f"}), {"_a", "_b"})
+        self.assertEqual(g.dependencies({"f", "g"}), {"_a", "_b", "_shared"})
+        self.assertEqual(g.dependencies({"Public2"}), {"_behind_public"})
+
+    def test_dependencies_used_by_module_code(self):
+        g = graph(
+            """
+            _X = 1
+            _Y = 2
+            def f(): return _X, _Y
+            if _X:
+                pass
+            """
+        )
+        self.assertEqual(g.dependencies({"f"}), {"_Y"})
+
+    def test_dependencies_defined_twice(self):
+        g = graph(
+            """
+            _X = 1
+            try:
+                from c import _X
+            except ImportError:
+                pass
+            def f(): return _X
+            """
+        )
+        self.assertNotIn("_X", g.definitions)
+        self.assertEqual(g.dependencies({"f"}), set())